@@ -4,10 +4,15 @@ import streamlit as st
 from streamlit_webrtc import webrtc_streamer, WebRtcMode, RTCConfiguration
 import numpy as np
 from play import RamperVirtualPainter
+from inference import HandTrackingPool
+from sessions import SessionManager
+from quality import QualityController
+from rtc import IceServerCache, default_provider
 
 st.set_page_config(page_title="FunDraw_ChemLab", layout="wide")
 
 import queue
+import time
 
 # CSS for modern dark theme
 st.markdown("""
@@ -48,54 +53,134 @@ st.title("🎨 FunDraw_ChemLab")
 
 if "command_queue" not in st.session_state:
     st.session_state["command_queue"] = queue.Queue()
+if "reply_queue" not in st.session_state:
+    # Acks from the video thread; bounded, the painter drops the oldest when full
+    st.session_state["reply_queue"] = queue.Queue(maxsize=32)
+    st.session_state["replies"] = []
 
 # RTC Configuration for Cloud (Render)
-# RTC Configuration
 import os
-from twilio.rest import Client
-
-# Default STUN servers
-ice_servers = [
-    {"urls": ["stun:stun.l.google.com:19302"]},
-    {"urls": ["stun:stun1.l.google.com:19302"]},
-    {"urls": ["stun:stun2.l.google.com:19302"]},
-]
-
-# If Twilio credentials are provided, fetch TURN servers
-# This is crucial for cloud deployment where STUN is not enough
-if "TWILIO_ACCOUNT_SID" in os.environ and "TWILIO_AUTH_TOKEN" in os.environ:
-    try:
-        client = Client(os.environ["TWILIO_ACCOUNT_SID"], os.environ["TWILIO_AUTH_TOKEN"])
-        token = client.tokens.create()
-        ice_servers = token.ice_servers
-    except Exception as e:
-        print(f"Error fetching Twilio TURN servers: {e}")
-
-RTC_CONFIGURATION = RTCConfiguration({"iceServers": ice_servers})
+
+# ICE servers are fetched once per TTL (FUNDRAW_ICE_TTL seconds), not on
+# every rerun; see rtc.py for the Twilio and local providers
+@st.cache_resource
+def get_ice_servers():
+    return IceServerCache(default_provider(), ttl=float(os.environ.get("FUNDRAW_ICE_TTL", "3600")))
+
+# Optional model input width (e.g. 640); frames are scaled down before inference
+INFERENCE_WIDTH = int(os.environ["FUNDRAW_INFERENCE_WIDTH"]) if os.environ.get("FUNDRAW_INFERENCE_WIDTH") else None
+
+# Each session adapts its quality to hold this frame rate under load
+TARGET_FPS = float(os.environ.get("FUNDRAW_TARGET_FPS", "24"))
+
+# One bounded pool of hand-tracking workers shared by every connected peer.
+# Its workers load MediaPipe and warm up a graph in the background as soon as
+# the page first loads, so the first video frame does not stall. Each worker
+# lends at most FUNDRAW_GRAPHS_PER_WORKER tracking graphs to its sessions.
+@st.cache_resource
+def get_hand_pool():
+    return HandTrackingPool(
+        max_workers=int(os.environ.get("FUNDRAW_INFERENCE_WORKERS", "2")),
+        graphs_per_worker=int(os.environ.get("FUNDRAW_GRAPHS_PER_WORKER", "2")),
+    )
+
+# Admission control shared by every peer: the first FUNDRAW_FULL_SESSIONS
+# get the full painter, the rest up to FUNDRAW_MAX_SESSIONS run degraded
+@st.cache_resource
+def get_session_manager():
+    return SessionManager(
+        max_sessions=int(os.environ.get("FUNDRAW_MAX_SESSIONS", "8")),
+        full_sessions=int(os.environ.get("FUNDRAW_FULL_SESSIONS", "4")),
+        idle_timeout=float(os.environ.get("FUNDRAW_IDLE_TIMEOUT", "300")),
+    )
+
+def server_full_frame(frame, text="The lab is full - retrying shortly"):
+    img = frame.to_ndarray(format="bgr24")
+    h, w = img.shape[:2]
+    img //= 3
+    (tw, th), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.9, 2)
+    cv2.putText(img, text, ((w - tw) // 2, (h + th) // 2), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (255, 255, 255), 2, cv2.LINE_AA)
+    return av.VideoFrame.from_ndarray(img, format="bgr24")
 
 class VideoProcessor:
-    def __init__(self, command_queue):
+    def __init__(self, command_queue, reply_queue, hand_pool, session_manager):
         self.command_queue = command_queue
-        self.painter = None
+        self.reply_queue = reply_queue
+        self.hand_pool = hand_pool
+        self.session_manager = session_manager
+        self.session = None
+        self.next_admit = 0.0
 
     def recv(self, frame: av.VideoFrame) -> av.VideoFrame:
+        manager = self.session_manager
+        manager.reap()
+        # Sessions reclaimed while idle are re-admitted with a fresh painter
+        if self.session is not None and self.session.closed:
+            self.session = None
+        if self.session is None:
+            now = time.time()
+            if now < self.next_admit:
+                return server_full_frame(frame)
+            self.session = manager.admit()
+            if self.session is None:
+                self.next_admit = now + 5.0
+                return server_full_frame(frame)
+            # No point admitting a peer when no worker could load the hand model
+            if not self.hand_pool.available():
+                self.session.close()
+                self.session = None
+                self.next_admit = now + 5.0
+                return server_full_frame(frame, "Hand tracking is unavailable - retrying shortly")
+
+        session = self.session
+        with session.lock:
+            if session.closed:
+                return frame
+            start, cpu = time.perf_counter(), time.thread_time()
+            out = self.process(session, frame)
+            session.record(time.thread_time() - cpu, time.perf_counter() - start)
+        return out
+
+    def process(self, session, frame):
         img = frame.to_ndarray(format="bgr24")
-        
-        if self.painter is None:
-            self.painter = RamperVirtualPainter(
+
+        if session.painter is None:
+            options = {"inference_width": INFERENCE_WIDTH}
+            options.update(session.options)
+            session.painter = RamperVirtualPainter(
                 width=img.shape[1], 
                 height=img.shape[0], 
-                command_queue=self.command_queue
+                command_queue=self.command_queue,
+                reply_queue=self.reply_queue,
+                hand_tracker=self.hand_pool.open_session(),
+                quality=QualityController(target_fps=TARGET_FPS, seed=session.id),
+                **options
             )
+        painter = session.painter
+
+        # With a reduced model input, let the decoder scale and convert to
+        # RGB in one pass instead of resizing and converting the BGR frame.
+        # The painter only asks for it on frames that run inference on the
+        # whole frame.
+        rgb = None
+        if painter.preprocessor.inference_width is not None:
+            def rgb():
+                iw, ih = painter.preprocessor.input_size(img.shape[1], img.shape[0])
+                return frame.reformat(width=iw, height=ih, format="rgb24").to_ndarray()
 
         try:
-            processed_img = self.painter.process_frame(img)
+            processed_img = painter.process_frame(img, rgb)
         except Exception as e:
             # print(f"Error processing frame: {e}")
             processed_img = img
 
         return av.VideoFrame.from_ndarray(processed_img, format="bgr24")
 
+    def on_ended(self):
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
 # Factory to pass the queue to the processor
 import functools
 
@@ -109,15 +194,18 @@ def main():
             
         # Capture the queue object in a local variable to pass to the thread safely
         cmd_queue = st.session_state["command_queue"]
+        reply_queue = st.session_state["reply_queue"]
+        hand_pool = get_hand_pool()
+        session_manager = get_session_manager()
             
         # factory wrapper uses the captured variable
         def video_processor_factory():
-            return VideoProcessor(cmd_queue)
+            return VideoProcessor(cmd_queue, reply_queue, hand_pool, session_manager)
 
-        webrtc_streamer(
+        ctx = webrtc_streamer(
             key="ramper-painter",
             mode=WebRtcMode.SENDRECV,
-            rtc_configuration=RTC_CONFIGURATION,
+            rtc_configuration=RTCConfiguration({"iceServers": get_ice_servers().get()}),
             video_processor_factory=video_processor_factory,
             media_stream_constraints={
                 "video": {"width": {"ideal": 1280}, "height": {"ideal": 720}},
@@ -151,10 +239,57 @@ def main():
         
         if st.button("🗑️ Clear Canvas"):
             st.session_state["command_queue"].put({"type": "clear"})
+
+        u1, u2 = st.columns(2)
+        with u1:
+            if st.button("↩️ Undo"):
+                st.session_state["command_queue"].put({"type": "undo"})
+        with u2:
+            if st.button("↪️ Redo"):
+                st.session_state["command_queue"].put({"type": "redo"})
             
+        save_format = st.selectbox("Save format", ["png", "webp", "jpeg", "svg", "strokes"])
         if st.button("💾 Save Art"):
-            st.session_state["command_queue"].put({"type": "save"})
-            st.success("Saved to disk!")
+            st.session_state["command_queue"].put({"type": "save", "format": save_format})
+            st.success("Saving in the background...")
+
+        # Acks arrive from the video thread (saves finish later, off it);
+        # show the most recent few
+        replies = st.session_state["replies"]
+        while True:
+            try:
+                replies.append(st.session_state["reply_queue"].get_nowait())
+            except queue.Empty:
+                break
+        del replies[:-3]
+        for reply in reversed(replies):
+            st.caption(("" if reply["ok"] else "⚠️ ") + reply["message"])
+
+        st.markdown("---")
+
+        show_profiler = st.checkbox("⏱️ Show profiler", value=False)
+        if show_profiler != st.session_state.get("show_profiler", False):
+            st.session_state["show_profiler"] = show_profiler
+            st.session_state["command_queue"].put({"type": "profiler", "show": show_profiler})
+
+        if st.button("📈 Export Trace"):
+            st.session_state["command_queue"].put({"type": "dump_trace", "format": "json"})
+
+        processor = ctx.video_processor if ctx else None
+        if processor is not None and processor.session is not None and processor.session.degraded:
+            st.info("The server is busy, so this session runs at reduced quality.")
+
+        with st.expander("🖥️ Server"):
+            stats = get_session_manager().stats()
+            st.caption(f"Sessions: {stats['sessions']}/{stats['max_sessions']} "
+                       f"({stats['degraded']} degraded), {stats['memory_mb']} MB, "
+                       f"rejected {stats['rejected']}, reclaimed {stats['reclaimed']}")
+            # Includes the shared graphs no session is charged for
+            pool = get_hand_pool().stats()
+            st.caption(f"Hand tracking: {pool['graphs']} graphs ({pool['tracking']} lent to sessions), "
+                       f"{pool['memory_mb']} MB, {pool['busy']}/{pool['workers']} workers busy")
+            if stats["per_session"]:
+                st.table(stats["per_session"])
 
     st.markdown("---")
     st.markdown("Built with OpenCV, MediaPipe, and Streamlit.")
@@ -0,0 +1,289 @@
+import argparse
+import json
+import sys
+import time
+
+import cv2
+import numpy as np
+
+import strokes
+
+# Offline microbenchmarks. Run `python bench.py --help` for the available suites.
+
+def draw_segment_stamped(img, start_pos, end_pos, color, thickness):
+    # Reference copy of the original brush: one filled circle every 2px
+    x0, y0 = int(start_pos[0]), int(start_pos[1])
+    x1, y1 = int(end_pos[0]), int(end_pos[1])
+    dist = int(np.hypot(x1 - x0, y1 - y0))
+    if dist == 0:
+        cv2.circle(img, (x1, y1), thickness // 2, color, -1)
+        return
+    steps = max(1, dist // 2)
+    for i in range(steps + 1):
+        t = i / steps
+        xi = int(x0 + (x1 - x0) * t)
+        yi = int(y0 + (y1 - y0) * t)
+        cv2.circle(img, (xi, yi), thickness // 2, color, -1)
+
+def random_segments(count, length, width, height, seed):
+    rng = np.random.default_rng(seed)
+    segments = []
+    for _ in range(count):
+        x0 = int(rng.integers(0, width))
+        y0 = int(rng.integers(0, height))
+        angle = rng.uniform(0, 2 * np.pi)
+        seg_len = rng.uniform(0, length)
+        x1 = int(np.clip(x0 + seg_len * np.cos(angle), 0, width - 1))
+        y1 = int(np.clip(y0 + seg_len * np.sin(angle), 0, height - 1))
+        segments.append(((x0, y0), (x1, y1)))
+    return segments
+
+def time_brush(draw_fn, segments, thickness, width, height, repeat):
+    img = np.zeros((height, width, 3), dtype=np.uint8)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for p0, p1 in segments:
+            draw_fn(img, p0, p1, (0, 255, 0), thickness)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(segments)
+
+def compare_pixels(segments, thickness, width, height):
+    # Fraction of differing pixels, new area over stamped area, and how many
+    # pixels lie more than 1px from the other mask (as a fraction of the
+    # stamped area)
+    kernel = np.ones((3, 3), dtype=np.uint8)
+    differing, inked, drawn, outside = 0, 0, 0, 0
+    for p0, p1 in segments:
+        old = np.zeros((height, width), dtype=np.uint8)
+        new = np.zeros((height, width), dtype=np.uint8)
+        draw_segment_stamped(old, p0, p1, 255, thickness)
+        strokes.draw_segment(new, p0, p1, 255, thickness)
+        differing += int(np.count_nonzero(old != new))
+        inked += int(np.count_nonzero(old))
+        drawn += int(np.count_nonzero(new))
+        outside += int(np.count_nonzero((old > 0) & (cv2.dilate(new, kernel) == 0)))
+        outside += int(np.count_nonzero((new > 0) & (cv2.dilate(old, kernel) == 0)))
+    inked = max(1, inked)
+    return differing / inked, drawn / inked, outside / inked
+
+def run_stroke_bench(args):
+    segments = random_segments(args.segments, args.length, args.width, args.height, args.seed)
+    check = segments[:args.check]
+    print(f"Stroke rasterizer: {len(segments)} segments up to {args.length}px on {args.width}x{args.height}")
+    print(f"{'thick':>5} {'stamped us':>11} {'line us':>9} {'speedup':>8} {'diff %':>7} {'area':>6} {'>1px %':>7}")
+    failed = []
+    for thickness in args.thickness:
+        stamped = time_brush(draw_segment_stamped, segments, thickness, args.width, args.height, args.repeat)
+        line = time_brush(strokes.draw_segment, segments, thickness, args.width, args.height, args.repeat)
+        diff_frac, area, outside = compare_pixels(check, thickness, args.width, args.height)
+        print(f"{thickness:>5} {stamped * 1e6:>11.1f} {line * 1e6:>9.1f} {stamped / line:>7.1f}x "
+              f"{diff_frac * 100:>6.2f}% {area:>6.3f} {outside * 100:>6.3f}%")
+        if abs(area - 1.0) > args.max_area_error or outside > args.max_outside:
+            failed.append(thickness)
+    if failed:
+        sys.exit(f"Stroke output outside tolerance (area within {args.max_area_error:.0%}, "
+                 f"at most {args.max_outside:.2%} of pixels beyond 1px) at thickness {failed}")
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def synthetic_frames(width, height, count=60, seed=0):
+    # Noisy backdrop with a moving bright block, so motion-gated inference and
+    # video compression-like content are both exercised
+    rng = np.random.default_rng(seed)
+    base = cv2.GaussianBlur(rng.integers(0, 256, (height, width, 3), dtype=np.uint8), (0, 0), 9)
+    frames = []
+    for i in range(count):
+        frame = base.copy()
+        x = int((width - 200) * (0.5 + 0.5 * np.sin(2 * np.pi * i / count)))
+        cv2.rectangle(frame, (x, height // 3), (x + 200, height // 3 + 200), (200, 180, 160), -1)
+        frames.append(frame)
+    while True:
+        for frame in frames:
+            yield frame
+
+def video_frames(path):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise SystemExit(f"Cannot open video: {path}")
+    while True:
+        success, frame = cap.read()
+        if not success:
+            # Loop the recording
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            success, frame = cap.read()
+            if not success:
+                raise SystemExit(f"No frames in video: {path}")
+        yield frame
+
+def hand_pose(x, y, pose, w, h):
+    # 21 normalized landmarks with the index tip at pixel (x, y), shaped so that
+    # RamperVirtualPainter.fingers_up reads the requested pose:
+    # "draw" (index), "select" (index + middle), "pinch" (thumb + index), "fist"
+    up = {"draw": (8,), "select": (8, 12), "pinch": (4, 8), "fist": ()}[pose]
+    pts = [[x, y + 60] for _ in range(21)]
+    for tip, pip in ((8, 6), (12, 10), (16, 14), (20, 18)):
+        pts[pip] = [x + (tip - 8) * 3, y + 40]
+        pts[tip] = [x + (tip - 8) * 3, y if tip in up else y + 70]
+    pts[3] = [x + 20, y + 30]
+    pts[4] = [x + 10, y + 20] if 4 in up else [x + 45, y + 30]
+    return [[px / w, py / h] for px, py in pts]
+
+def scripted_track(painter, mode, w, h, cycles=4):
+    # Repeating gesture script: pick a tool from the toolbar, then use it
+    track = []
+    toolbar_y = painter.toolbar_height // 2
+    layout = painter.ui_layout(w, h)
+    for cycle in range(cycles):
+        if mode == "PAINTER":
+            color_x = layout.card_center("PAINTER", cycle % 7)[0]
+            track += [hand_pose(color_x, toolbar_y, "select", w, h)] * 40
+            for i in range(180):
+                angle = 2 * np.pi * i / 90
+                x = w / 2 + 0.3 * w * np.cos(angle)
+                y = 0.6 * h + 0.15 * h * np.sin(2 * angle)
+                track.append(hand_pose(x, y, "draw", w, h))
+            track += [None] * 20
+        else:
+            chem_x = layout.card_center("CHEMISTRY", cycle % 2)[0]
+            track += [hand_pose(chem_x, toolbar_y, "select", w, h)] * 40
+            # Drag from below the toolbar into the middle beaker and release
+            start, end = (chem_x, h * 0.35), (w // 2, h * 0.52)
+            for i in range(60):
+                t = i / 59
+                x = start[0] + (end[0] - start[0]) * t
+                y = start[1] + (end[1] - start[1]) * t
+                track.append(hand_pose(x, y, "pinch", w, h))
+            track += [hand_pose(end[0], end[1], "draw", w, h)] * 10
+            track += [None] * 30
+    return track
+
+def run_frames_bench(args):
+    from inference import LocalHandTracker, RecordingHandTracker, ScriptedHandTracker
+    from play import RamperVirtualPainter
+
+    modes = ["PAINTER", "CHEMISTRY"] if args.mode == "both" else [args.mode.upper()]
+    if args.video:
+        source = video_frames(args.video)
+        first = next(source)
+        height, width = first.shape[:2]
+    else:
+        width, height = args.width, args.height
+        source = synthetic_frames(width, height)
+
+    report = {"source": args.video or "synthetic", "size": [width, height], "modes": {}}
+    print(f"Frame benchmark: {report['source']} {width}x{height}, {args.frames} frames per mode, hands={args.hands}")
+    print(f"{'mode':<10} {'fps':>7} {'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7}")
+
+    for mode in modes:
+        if args.hands == "mediapipe":
+            tracker = LocalHandTracker()
+            if args.save_track:
+                tracker = RecordingHandTracker(tracker)
+        else:
+            tracker = ScriptedHandTracker([])
+        painter = RamperVirtualPainter(width=width, height=height, hand_tracker=tracker,
+                                       inference_interval=args.inference_interval,
+                                       motion_threshold=args.motion_threshold,
+                                       inference_width=args.inference_width,
+                                       roi_crop=args.roi_crop)
+        painter.app_mode = mode
+        if args.hands == "scripted":
+            tracker.track = scripted_track(painter, mode, width, height)
+        elif args.hands != "mediapipe":
+            tracker.track = ScriptedHandTracker.load(args.hands).track
+
+        for _ in range(args.warmup):
+            painter.process_frame(next(source))
+        painter.profiler.reset()
+
+        # Pacing at camera rate keeps the time-based gesture debounces realistic;
+        # only process_frame itself is timed
+        interval = 1.0 / args.pace if args.pace > 0 else 0.0
+        latencies = np.zeros(args.frames)
+        wall_start = time.perf_counter()
+        for i in range(args.frames):
+            frame = next(source)
+            start = time.perf_counter()
+            painter.process_frame(frame)
+            latencies[i] = time.perf_counter() - start
+            if interval:
+                time.sleep(max(0.0, wall_start + (i + 1) * interval - time.perf_counter()))
+        wall = time.perf_counter() - wall_start
+
+        p50, p95, p99 = np.percentile(latencies, (50, 95, 99)) * 1000
+        fps = args.frames / latencies.sum()
+        print(f"{mode:<10} {fps:>7.1f} {p50:>7.2f} {p95:>7.2f} {p99:>7.2f}")
+        report["modes"][mode] = {
+            "frames": args.frames, "fps": fps, "wall_s": wall,
+            "p50_ms": p50, "p95_ms": p95, "p99_ms": p99,
+            "stages": painter.profiler.summary(),
+        }
+        if args.stages:
+            for stage, st in report["modes"][mode]["stages"].items():
+                print(f"  {stage:<11} p50 {st['p50_ms']:6.2f}  p95 {st['p95_ms']:6.2f}  p99 {st['p99_ms']:6.2f}")
+        if args.save_track and isinstance(tracker, RecordingHandTracker):
+            path = args.save_track.replace(".json", f"_{mode.lower()}.json") if len(modes) > 1 else args.save_track
+            tracker.save(path)
+            print(f"  landmark track saved to {path}")
+        painter.close()
+
+    report["peak_rss_mb"] = peak_rss_mb()
+    if report["peak_rss_mb"] is not None:
+        print(f"peak RSS: {report['peak_rss_mb']:.1f} MB")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser(description="FunDraw_ChemLab offline benchmarks")
+    sub = parser.add_subparsers(dest="suite", required=True)
+
+    stroke = sub.add_parser("stroke", help="stamped-circle brush vs single thick line")
+    stroke.add_argument("--segments", type=int, default=500)
+    stroke.add_argument("--length", type=int, default=400, help="max segment length in px")
+    stroke.add_argument("--thickness", type=int, nargs="+", default=[2, 4, 8, 20, 40])
+    stroke.add_argument("--width", type=int, default=1280)
+    stroke.add_argument("--height", type=int, default=720)
+    stroke.add_argument("--repeat", type=int, default=3)
+    stroke.add_argument("--check", type=int, default=100, help="segments used for the pixel comparison")
+    stroke.add_argument("--max-area-error", type=float, default=0.1,
+                        help="fail when the covered area differs from the stamped brush by more than this fraction")
+    stroke.add_argument("--max-outside", type=float, default=0.001,
+                        help="fail when more than this fraction of pixels lie beyond 1px of the other brush")
+    stroke.add_argument("--seed", type=int, default=0)
+    stroke.set_defaults(func=run_stroke_bench)
+
+    frames = sub.add_parser("frames", help="drive process_frame headlessly from a video or synthetic frames")
+    frames.add_argument("--video", help="recorded video file (default: synthetic frames)")
+    frames.add_argument("--width", type=int, default=1280, help="synthetic frame width")
+    frames.add_argument("--height", type=int, default=720, help="synthetic frame height")
+    frames.add_argument("--mode", choices=["painter", "chemistry", "both"], default="both")
+    frames.add_argument("--frames", type=int, default=300)
+    frames.add_argument("--warmup", type=int, default=20)
+    frames.add_argument("--pace", type=float, default=30.0,
+                        help="feed frames at this rate (0 = as fast as possible)")
+    frames.add_argument("--hands", default="scripted",
+                        help="'scripted' (built-in gesture script), 'mediapipe', or a landmark track JSON")
+    frames.add_argument("--save-track", help="with --hands mediapipe, save the detected landmarks as a track")
+    frames.add_argument("--inference-interval", type=int, default=1)
+    frames.add_argument("--motion-threshold", type=float, default=None)
+    frames.add_argument("--inference-width", type=int, default=None)
+    frames.add_argument("--roi-crop", action="store_true")
+    frames.add_argument("--stages", action="store_true", help="print per-stage percentiles")
+    frames.add_argument("--json", help="write the report to this file")
+    frames.set_defaults(func=run_frames_bench)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+import csv
+import hashlib
+import json
+import os
+from itertools import combinations
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CHEMICALS = os.path.join(BASE_DIR, "chemicals.json")
+DEFAULT_CATALOG = os.path.join(BASE_DIR, "reactions.json")
+CACHE_DIR = os.path.join(BASE_DIR, ".catalog_cache")
+CACHE_VERSION = 1
+UNKNOWN_COLOR = (100, 100, 100)
+
+class ChemicalReaction:
+    def __init__(self, reactants, products, animation_type, color_change=None, text="", duration=3.0,
+                 priority=0):
+        self.reactants = set(reactants)
+        self.products = products
+        self.animation_type = animation_type  # 'fire', 'fizz', 'color_change', 'smoke', 'foam'
+        self.color_change = color_change
+        self.text = text
+        self.duration = duration
+        self.priority = priority
+
+def parse_color(value):
+    # [b, g, r] in JSON, "b g r" in CSV; empty means no colour change
+    if value is None or value == "" or value == []:
+        return None
+    if isinstance(value, str):
+        value = value.replace(",", " ").split()
+    color = tuple(int(c) for c in value)
+    if len(color) != 3:
+        raise ValueError(f"expected 3 colour components, got {value!r}")
+    return color
+
+def make_reaction(entry):
+    reactants = entry["reactants"]
+    if isinstance(reactants, str):
+        reactants = [r.strip() for r in reactants.split("+")]
+    reactants = [r for r in reactants if r]
+    if not reactants:
+        raise ValueError("reaction has no reactants")
+    return ChemicalReaction(
+        reactants, entry.get("products", ""),
+        entry.get("animation", "color_change"), parse_color(entry.get("color")),
+        entry.get("text", ""), float(entry.get("duration") or 3.0),
+        int(entry.get("priority") or 0)
+    )
+
+def make_chemical(entry):
+    # CSV columns other than name and color become properties
+    name = entry["name"].strip()
+    if not name:
+        raise ValueError("chemical has no name")
+    color = parse_color(entry.get("color")) or UNKNOWN_COLOR
+    properties = entry.get("properties")
+    if properties is None:
+        properties = {k: v for k, v in entry.items() if k not in ("name", "color") and v not in (None, "")}
+    return name, color, dict(properties)
+
+def read_entries(path, section):
+    # JSON: a list of entries, or {section: [...]}; CSV: one entry per row
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, newline="", encoding="utf-8") as f:
+        if ext == ".csv":
+            return list(csv.DictReader(f))
+        data = json.load(f)
+        return data[section] if isinstance(data, dict) else data
+
+def parse_entries(path, section, make):
+    items = []
+    for i, entry in enumerate(read_entries(path, section)):
+        try:
+            items.append(make(entry))
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"{path}: bad {section[:-1]} entry {i + 1}: {e}") from e
+    return items
+
+def load_reactions(path=DEFAULT_CATALOG):
+    # CSV header: reactants,products,animation,color,text,duration,priority
+    # with reactants joined by "+"
+    return parse_entries(path, "reactions", make_reaction)
+
+def load_chemicals(path=DEFAULT_CHEMICALS):
+    # CSV header: name,color and any property columns
+    return parse_entries(path, "chemicals", make_chemical)
+
+class ReactionIndex:
+    # Reactions keyed by the bitmask of their reactant IDs. A beaker's
+    # applicable reactions are found by looking up each subset of its
+    # contents up to the largest reactant count in the catalog, and the
+    # result is memoized per beaker mask, so the cost depends on the beaker,
+    # not on the catalog size. Matches are ordered by priority, then by
+    # number of reactants (more specific first), then by load order.
+    def __init__(self, reactions=(), ids=None):
+        self.ids = {} if ids is None else ids
+        self.by_mask = {}
+        self.reactions = []
+        self.masks = []
+        self.max_reactants = 0
+        self.matches = {}
+        for reaction in reactions:
+            self.add(reaction)
+
+    def chemical_id(self, name):
+        if name not in self.ids:
+            self.ids[name] = len(self.ids)
+        return self.ids[name]
+
+    def mask_of(self, chemicals):
+        # Chemicals no reaction or palette knows about can't match anything
+        mask = 0
+        for name in chemicals:
+            cid = self.ids.get(name)
+            if cid is not None:
+                mask |= 1 << cid
+        return mask
+
+    def add(self, reaction, mask=None):
+        if mask is None:
+            mask = 0
+            for name in reaction.reactants:
+                mask |= 1 << self.chemical_id(name)
+        rank = (-reaction.priority, -len(reaction.reactants), len(self.reactions))
+        bucket = self.by_mask.setdefault(mask, [])
+        bucket.append((rank, reaction))
+        bucket.sort(key=lambda item: item[0])
+        self.reactions.append(reaction)
+        self.masks.append(mask)
+        self.max_reactants = max(self.max_reactants, len(reaction.reactants))
+        self.matches = {}
+
+    def __len__(self):
+        return len(self.reactions)
+
+    def find_mask(self, mask):
+        matches = self.matches.get(mask)
+        if matches is None:
+            # Set bits only, so the cost follows the beaker contents rather
+            # than the highest chemical ID
+            bits = []
+            rest = mask
+            while rest:
+                low = rest & -rest
+                bits.append(low)
+                rest ^= low
+            found = []
+            for size in range(1, min(len(bits), self.max_reactants) + 1):
+                for subset in combinations(bits, size):
+                    found.extend(self.by_mask.get(sum(subset), ()))
+            found.sort(key=lambda item: item[0])
+            matches = self.matches[mask] = [reaction for _, reaction in found]
+        return matches
+
+    def first_mask(self, mask):
+        matches = self.find_mask(mask)
+        return matches[0] if matches else None
+
+    def find(self, chemicals):
+        return self.find_mask(self.mask_of(chemicals))
+
+    def first(self, chemicals):
+        return self.first_mask(self.mask_of(chemicals))
+
+class ChemicalCatalog:
+    # Chemicals and reactions compiled to dense integer IDs. ID i is bit i
+    # of a contents mask and row i of the colors array. The palette lists
+    # the chemicals declared in the chemicals file, in order; reactants that
+    # only appear in reactions get IDs after them with a neutral colour.
+    def __init__(self, chemicals, reactions, masks=None, palette_size=None):
+        self.names = []
+        self.properties = []
+        colors = []
+        self.index = ReactionIndex()
+        self.ids = self.index.ids
+        for name, color, properties in chemicals:
+            if name in self.ids:
+                continue
+            self.index.chemical_id(name)
+            self.names.append(name)
+            colors.append(color)
+            self.properties.append(properties)
+        self.palette = self.names[:palette_size]
+
+        for i, reaction in enumerate(reactions):
+            self.index.add(reaction, None if masks is None else masks[i])
+        for name in sorted(self.ids, key=self.ids.get)[len(self.names):]:
+            self.names.append(name)
+            colors.append(UNKNOWN_COLOR)
+            self.properties.append({})
+        self.colors = np.array(colors, dtype=np.int32).reshape(-1, 3)
+
+    @property
+    def reactions(self):
+        return self.index.reactions
+
+    def id(self, name):
+        return self.ids.get(name)
+
+    def mask(self, names):
+        return self.index.mask_of(names)
+
+    def color(self, name):
+        return tuple(int(c) for c in self.colors[self.ids[name]])
+
+    def to_plain(self):
+        # JSON-safe form for the on-disk cache
+        return {
+            "palette_size": len(self.palette),
+            "chemicals": [[n, [int(c) for c in col], p]
+                          for n, col, p in zip(self.names, self.colors, self.properties)],
+            "reactions": [[sorted(r.reactants), r.products, r.animation_type,
+                           list(r.color_change) if r.color_change else None,
+                           r.text, r.duration, r.priority, m]
+                          for r, m in zip(self.index.reactions, self.index.masks)],
+        }
+
+    @classmethod
+    def from_plain(cls, data):
+        chemicals = [(n, tuple(col), p) for n, col, p in data["chemicals"]]
+        reactions, masks = [], []
+        for reactants, products, animation, color, text, duration, priority, mask in data["reactions"]:
+            reactions.append(ChemicalReaction(reactants, products, animation,
+                                              tuple(color) if color else None, text, duration, priority))
+            masks.append(mask)
+        return cls(chemicals, reactions, masks, data["palette_size"])
+
+def source_stamp(paths):
+    return [[os.path.abspath(p), os.stat(p).st_mtime_ns, os.stat(p).st_size] for p in paths]
+
+def load_catalog(chemicals_path=None, reactions_path=None, cache_dir=CACHE_DIR):
+    # Parses and compiles the catalog, or reuses the compiled copy in
+    # cache_dir when neither source file changed (same mtime and size)
+    chemicals_path = chemicals_path or DEFAULT_CHEMICALS
+    reactions_path = reactions_path or DEFAULT_CATALOG
+    sources = [chemicals_path, reactions_path]
+    stamp = [CACHE_VERSION] + source_stamp(sources)
+    cache_path = None
+    if cache_dir:
+        # One cache file per pair of sources, overwritten when they change
+        name = hashlib.sha1(json.dumps([os.path.abspath(p) for p in sources]).encode()).hexdigest()[:16]
+        cache_path = os.path.join(cache_dir, f"catalog_{name}.json")
+        try:
+            with open(cache_path, encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached["stamp"] == stamp:
+                return ChemicalCatalog.from_plain(cached["catalog"])
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    catalog = ChemicalCatalog(load_chemicals(chemicals_path), load_reactions(reactions_path))
+    if cache_path:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = cache_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"stamp": stamp, "catalog": catalog.to_plain()}, f)
+            os.replace(tmp, cache_path)
+        except OSError as e:
+            print(f"[FunDraw_ChemLab] Could not write catalog cache: {e}")
+    return catalog
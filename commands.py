@@ -0,0 +1,171 @@
+import collections
+import queue
+
+from profiler import TRACE_FORMATS
+from saver import SAVE_FORMATS
+from strokes import VECTOR_FORMATS
+
+# Command types accepted on the command queue, with their validators. Commands
+# are plain dicts such as {"type": "brush_size", "action": "increase"}; an
+# optional "id" is echoed back in the reply.
+MODES = ("PAINTER", "CHEMISTRY")
+
+def _check_mode(cmd):
+    if cmd.get("value") not in MODES:
+        raise ValueError(f"mode must be one of {MODES}")
+
+def _check_brush(cmd):
+    delta = cmd.get("delta")
+    # bool is an int subclass, but True is not a size step
+    if cmd.get("action") not in ("increase", "decrease") and (not isinstance(delta, int) or isinstance(delta, bool)):
+        raise ValueError("brush_size needs action increase/decrease or an integer delta")
+
+def _check_save(cmd):
+    fmt = cmd.get("format")
+    if fmt is not None and fmt not in SAVE_FORMATS and fmt not in VECTOR_FORMATS:
+        raise ValueError(f"save format must be one of {sorted(SAVE_FORMATS) + sorted(VECTOR_FORMATS)}")
+
+def _check_trace(cmd):
+    if cmd.get("format", "json") not in TRACE_FORMATS:
+        raise ValueError(f"trace format must be one of {TRACE_FORMATS}")
+
+def _check_profiler(cmd):
+    if not isinstance(cmd.get("show"), bool):
+        raise ValueError("profiler needs a boolean 'show'")
+
+COMMAND_TYPES = {
+    "clear": None,
+    "save": _check_save,
+    "mode": _check_mode,
+    "brush_size": _check_brush,
+    "profiler": _check_profiler,
+    "dump_trace": _check_trace,
+    "undo": None,
+    "redo": None,
+}
+
+class CanvasStep:
+    # One run of canvas commands of the same kind: "clear" (count: clear
+    # commands; value and mode_ids: the mode switch that was part of it, if
+    # any), "undo"/"redo" (count) or "save" (value: format)
+    def __init__(self, kind, value=None):
+        self.kind = kind
+        self.value = value
+        self.count = 0
+        self.ids = []
+        self.mode_ids = []
+
+class CommandBatch:
+    # Everything queued since the last frame. Commands that touch the canvas
+    # keep their order; only consecutive commands of the same kind are merged
+    # (clears and mode switches collapse, undos/redos count up, a save format
+    # is kept once between two canvas changes). Brush steps, the profiler
+    # toggle and trace dumps do not interact with the canvas and are merged
+    # across the whole batch. Brush steps are summed into brush_delta and the
+    # size is clamped once, to the total: +10, -10 from the maximum size ends
+    # 10 below it, not at it.
+    def __init__(self):
+        self.count = 0
+        self.steps = []
+        self.brush_delta = 0
+        self.profiler = None
+        self.traces = []
+        self.ids = collections.defaultdict(list)
+        self.errors = []
+
+    def __bool__(self):
+        return self.count > 0 or bool(self.errors)
+
+    def add(self, cmd):
+        kind = cmd["type"]
+        self.count += 1
+        ids = [cmd["id"]] if "id" in cmd else []
+        if kind in ("clear", "mode"):
+            step = self.canvas_step("clear")
+            if kind == "mode":
+                step.value = cmd["value"]
+                step.mode_ids += ids
+                return
+        elif kind in ("undo", "redo"):
+            step = self.canvas_step(kind)
+        elif kind == "save":
+            fmt = cmd.get("format")
+            step = None
+            for prev in reversed(self.steps):
+                if prev.kind != "save":
+                    break
+                if prev.value == fmt:
+                    step = prev
+                    break
+            if step is None:
+                step = CanvasStep("save", fmt)
+                self.steps.append(step)
+        else:
+            self.ids[kind] += ids
+            if kind == "brush_size":
+                if "delta" in cmd:
+                    self.brush_delta += cmd["delta"]
+                else:
+                    self.brush_delta += 2 if cmd["action"] == "increase" else -2
+            elif kind == "profiler":
+                self.profiler = cmd["show"]
+            elif kind == "dump_trace":
+                fmt = cmd.get("format", "json")
+                if fmt not in self.traces:
+                    self.traces.append(fmt)
+            return
+        step.count += 1
+        step.ids += ids
+
+    def canvas_step(self, kind):
+        if self.steps and self.steps[-1].kind == kind:
+            return self.steps[-1]
+        step = CanvasStep(kind)
+        self.steps.append(step)
+        return step
+
+class CommandBus:
+    # Typed front end for the UI command queue plus a reply channel back to
+    # the UI. drain() takes at most max_per_frame commands, so a flood of
+    # button presses costs one coalesced batch per frame.
+    def __init__(self, command_queue=None, reply_queue=None, max_per_frame=256):
+        self.command_queue = command_queue
+        self.reply_queue = reply_queue
+        self.max_per_frame = max_per_frame
+
+    def drain(self):
+        batch = CommandBatch()
+        if self.command_queue is None:
+            return batch
+        for _ in range(self.max_per_frame):
+            try:
+                cmd = self.command_queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                if not isinstance(cmd, dict) or cmd.get("type") not in COMMAND_TYPES:
+                    raise ValueError(f"unknown command {cmd!r}")
+                check = COMMAND_TYPES[cmd["type"]]
+                if check is not None:
+                    check(cmd)
+            except ValueError as e:
+                batch.errors.append((cmd, str(e)))
+                continue
+            batch.add(cmd)
+        return batch
+
+    def reply(self, kind, ok=True, message="", ids=()):
+        # Never blocks the frame loop: when the UI is not reading, the
+        # oldest reply is dropped
+        if self.reply_queue is None:
+            return
+        msg = {"type": kind, "ok": ok, "message": message, "ids": list(ids)}
+        while True:
+            try:
+                self.reply_queue.put_nowait(msg)
+                return
+            except queue.Full:
+                try:
+                    self.reply_queue.get_nowait()
+                except queue.Empty:
+                    pass
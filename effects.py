@@ -0,0 +1,61 @@
+import cv2
+import numpy as np
+
+class EffectsLayer:
+    # Transient layer for reaction animations. Effects are drawn over the
+    # composited frame every frame, so nothing is burned into the canvas.
+    # Translucent shapes blend through a preallocated scratch buffer and
+    # only within their own bounding box.
+    def __init__(self):
+        self.frame = None
+        self.scratch = None
+        self.bbox = None
+
+    def begin(self, frame):
+        if self.scratch is None or self.scratch.shape != frame.shape:
+            self.scratch = np.empty_like(frame)
+        self.frame = frame
+        self.bbox = None
+
+    def end(self):
+        # Returns the bounding box of everything drawn this frame (or None)
+        self.frame = None
+        return self.bbox
+
+    def mark(self, bbox):
+        if bbox is None:
+            return
+        if self.bbox is None:
+            self.bbox = bbox
+        else:
+            b = self.bbox
+            self.bbox = (min(b[0], bbox[0]), min(b[1], bbox[1]), max(b[2], bbox[2]), max(b[3], bbox[3]))
+
+    def clip(self, x1, y1, x2, y2):
+        h, w = self.frame.shape[:2]
+        x1, y1 = max(0, int(x1)), max(0, int(y1))
+        x2, y2 = min(w, int(x2)), min(h, int(y2))
+        if x1 >= x2 or y1 >= y2:
+            return None
+        return x1, y1, x2, y2
+
+    def blend_circle(self, center, radius, color, alpha):
+        if radius <= 0 or alpha <= 0:
+            return
+        x, y = center
+        box = self.clip(x - radius, y - radius, x + radius + 1, y + radius + 1)
+        if box is None:
+            return
+        x1, y1, x2, y2 = box
+        roi = self.frame[y1:y2, x1:x2]
+        tmp = self.scratch[y1:y2, x1:x2]
+        np.copyto(tmp, roi)
+        cv2.circle(tmp, (x - x1, y - y1), radius, color, -1)
+        cv2.addWeighted(roi, 1 - alpha, tmp, alpha, 0, dst=roi)
+        self.mark(box)
+
+    def draw_particles(self, system):
+        system.render(self.frame)
+        bounds = system.bounds()
+        if bounds is not None:
+            self.mark(self.clip(*bounds))
@@ -0,0 +1,118 @@
+import collections
+
+class HistoryEntry:
+    def __init__(self, strokes):
+        self.tiles = {}
+        self.strokes = strokes
+        self.nbytes = 0
+
+class CanvasHistory:
+    # Multi-level undo/redo for the painter canvas. The canvas is treated as a
+    # grid of tile x tile blocks; while a stroke is being recorded, the first
+    # write to a block copies its old pixels (copy-on-write), so an entry only
+    # holds the blocks that stroke touched. Undo and redo swap those blocks
+    # with the canvas, so the same copies serve both directions. When the
+    # stored blocks exceed max_bytes, the least recently used entries (the
+    # bottom of the undo stack, then the far end of the redo stack) are
+    # dropped.
+    def __init__(self, tile=64, max_bytes=16 * 1024 * 1024, max_entries=100):
+        self.tile = tile
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.reset()
+
+    def reset(self):
+        self.undo_stack = collections.deque()
+        self.redo_stack = collections.deque()
+        self.current = None
+        self.nbytes = 0
+        self.evicted = 0
+
+    @property
+    def recording(self):
+        return self.current is not None
+
+    def begin(self, log=None):
+        # log: the StrokeLog to restore alongside the pixels
+        if self.current is None:
+            self.current = HistoryEntry(list(log.strokes) if log is not None else None)
+
+    def touch(self, canvas, bbox):
+        # Call before drawing into bbox (x1, y1, x2, y2, exclusive ends)
+        entry = self.current
+        if entry is None:
+            return
+        h, w = canvas.shape[:2]
+        t = self.tile
+        x1, y1 = max(0, int(bbox[0])), max(0, int(bbox[1]))
+        x2, y2 = min(w, int(bbox[2])), min(h, int(bbox[3]))
+        if x1 >= x2 or y1 >= y2:
+            return
+        for ty in range(y1 // t, (y2 - 1) // t + 1):
+            for tx in range(x1 // t, (x2 - 1) // t + 1):
+                if (ty, tx) not in entry.tiles:
+                    block = canvas[ty * t:(ty + 1) * t, tx * t:(tx + 1) * t].copy()
+                    entry.tiles[(ty, tx)] = block
+                    entry.nbytes += block.nbytes
+
+    def end(self):
+        entry, self.current = self.current, None
+        if entry is None or not entry.tiles:
+            return False
+        self.nbytes -= sum(e.nbytes for e in self.redo_stack)
+        self.redo_stack.clear()
+        self.undo_stack.append(entry)
+        self.nbytes += entry.nbytes
+        self.enforce_limits()
+        return True
+
+    def enforce_limits(self):
+        while self.undo_stack and (self.nbytes > self.max_bytes
+                                   or len(self.undo_stack) + len(self.redo_stack) > self.max_entries):
+            self.nbytes -= self.undo_stack.popleft().nbytes
+            self.evicted += 1
+        while self.redo_stack and self.nbytes > self.max_bytes:
+            self.nbytes -= self.redo_stack.popleft().nbytes
+            self.evicted += 1
+
+    def swap(self, entry, canvas, log):
+        # Exchanges the entry's blocks (and stroke list) with the canvas;
+        # returns the bounding box of the restored blocks
+        t = self.tile
+        h, w = canvas.shape[:2]
+        x1 = y1 = None
+        for (ty, tx), block in entry.tiles.items():
+            view = canvas[ty * t:(ty + 1) * t, tx * t:(tx + 1) * t]
+            if view.shape != block.shape:
+                continue
+            current = view.copy()
+            view[:] = block
+            entry.tiles[(ty, tx)] = current
+            bx1, by1 = tx * t, ty * t
+            bx2, by2 = min(w, bx1 + t), min(h, by1 + t)
+            if x1 is None:
+                x1, y1, x2, y2 = bx1, by1, bx2, by2
+            else:
+                x1, y1, x2, y2 = min(x1, bx1), min(y1, by1), max(x2, bx2), max(y2, by2)
+        if log is not None and entry.strokes is not None:
+            entry.strokes, log.strokes = log.strokes, entry.strokes
+        return None if x1 is None else (x1, y1, x2, y2)
+
+    def undo(self, canvas, log=None):
+        self.end()
+        if not self.undo_stack:
+            return None
+        entry = self.undo_stack.pop()
+        self.redo_stack.append(entry)
+        return self.swap(entry, canvas, log)
+
+    def redo(self, canvas, log=None):
+        if self.current is not None or not self.redo_stack:
+            return None
+        entry = self.redo_stack.pop()
+        self.undo_stack.append(entry)
+        return self.swap(entry, canvas, log)
+
+    def stats(self):
+        return {"undo": len(self.undo_stack), "redo": len(self.redo_stack),
+                "bytes": self.nbytes, "evicted": self.evicted}
@@ -0,0 +1,703 @@
+import collections
+import json
+import threading
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+# Hand-landmark backends. Anything with process(rgb) -> results (exposing
+# multi_hand_landmarks / multi_handedness like MediaPipe's output) and close()
+# can be handed to RamperVirtualPainter as its hand tracker.
+
+HANDS_OPTIONS = {
+    "static_image_mode": False,
+    "max_num_hands": 1,
+    "min_detection_confidence": 0.75,
+    "min_tracking_confidence": 0.7,
+}
+
+NO_HANDS = SimpleNamespace(multi_hand_landmarks=None, multi_handedness=None)
+# Returned by asynchronous trackers when no result for the frame arrived in
+# time; callers treat it like a frame on which inference was skipped
+STALE = SimpleNamespace(multi_hand_landmarks=None, multi_handedness=None)
+
+def load_mediapipe():
+    # MediaPipe takes seconds to import, so it is loaded on first use rather
+    # than when the app (or a tool that never runs the model) starts
+    import mediapipe
+    return mediapipe
+
+def create_hands(**overrides):
+    options = dict(HANDS_OPTIONS)
+    options.update(overrides)
+    return load_mediapipe().solutions.hands.Hands(**options)
+
+def warm_up(hands):
+    # The first process() call initializes the inference runtime; do it on a
+    # blank frame before a real one is waiting
+    hands.process(np.zeros((256, 256, 3), dtype=np.uint8))
+
+class LocalHandTracker:
+    # One MediaPipe graph owned by a single painter (desktop / single user).
+    # With background=True the graph is built and warmed up on a thread, and
+    # frames arriving before it is ready report no hands.
+    def __init__(self, background=False, **options):
+        self.hands = None
+        self.ready = threading.Event()
+        if background:
+            threading.Thread(target=self._load, args=(options,), name="hand-model-load", daemon=True).start()
+        else:
+            self._load(options)
+
+    def _load(self, options):
+        try:
+            hands = create_hands(**options)
+            warm_up(hands)
+            self.hands = hands
+        except Exception as e:
+            print(f"[FunDraw_ChemLab] Could not load the hand model: {e}")
+        finally:
+            self.ready.set()
+
+    def process(self, rgb):
+        if self.hands is None:
+            return NO_HANDS
+        return self.hands.process(rgb)
+
+    def close(self):
+        self.ready.wait()
+        if self.hands is not None:
+            self.hands.close()
+
+# Rough resident size of one MediaPipe hands graph, for memory reporting
+GRAPH_BYTES = 75 * 1024 * 1024
+
+class HandTrackingPool:
+    # A bounded set of inference threads shared by every connected session, so
+    # at most max_workers inferences run at once no matter how many peers are
+    # connected. Sessions hold at most one pending frame: a newer frame
+    # replaces a stale one that has not started yet, and callers wait at most
+    # max_wait before reusing their last result.
+    #
+    # Each session is pinned to one worker when it opens. Every worker warms
+    # up one static-image graph that any of its sessions can use, plus at most
+    # graphs_per_worker tracking-mode graphs lent to one session at a time, so
+    # MediaPipe follows that user's hand from frame to frame instead of running
+    # palm detection on each one. Tracking graphs are built and warmed up on a
+    # builder thread and handed to the worker once ready; until then, and for
+    # sessions beyond the cap, frames go through the shared graph. A released
+    # session's graph is lent to the next one, so memory stays at
+    # max_workers * (1 + graphs_per_worker) graphs. With static_image_mode=True
+    # only the shared graphs are used.
+    def __init__(self, max_workers=2, max_wait=0.1, graphs_per_worker=2, **options):
+        self.options = options
+        self.tracking = not options.get("static_image_mode", HANDS_OPTIONS["static_image_mode"])
+        self.max_workers = max_workers
+        self.max_wait = max_wait
+        self.graphs_per_worker = graphs_per_worker if self.tracking else 0
+
+        self.cond = threading.Condition()
+        self.queues = [collections.deque() for _ in range(max_workers)]
+        self.load = [0] * max_workers
+        # Tracking graphs per worker: built (lent or idle), idle ones, and
+        # the worker the builder is working for
+        self.graphs = [0] * max_workers
+        self.idle = [[] for _ in range(max_workers)]
+        self.building = None
+        self.failed = set()
+        self.sessions = set()
+        self.busy = 0
+        self.warm = 0
+        self.closed = False
+
+        self.workers = []
+        for i in range(max_workers):
+            t = threading.Thread(target=self._worker, args=(i,), name=f"hand-pool-{i}", daemon=True)
+            t.start()
+            self.workers.append(t)
+        self.builder = None
+        if self.graphs_per_worker:
+            self.builder = threading.Thread(target=self._builder, name="hand-pool-builder", daemon=True)
+            self.builder.start()
+
+    def available(self):
+        # False once every worker has failed to load the hand model
+        with self.cond:
+            return not self.closed and len(self.failed) < self.max_workers
+
+    def open_session(self):
+        session = PooledHandTracker(self)
+        with self.cond:
+            self._pin(session)
+            self.sessions.add(session)
+            self._lend(session)
+            self.cond.notify_all()
+        return session
+
+    def _pin(self, session):
+        # Least loaded worker that has not failed; None when there is none
+        live = [i for i in range(self.max_workers) if i not in self.failed]
+        session.worker = min(live, key=lambda i: self.load[i]) if live else None
+        if session.worker is not None:
+            self.load[session.worker] += 1
+
+    def _lend(self, session):
+        # Gives the session an idle tracking graph of its worker, if any
+        if session.graph is None and session.worker is not None and self.idle[session.worker]:
+            session.graph = self.idle[session.worker].pop()
+
+    def _wanted(self, index):
+        # Sessions of a worker still waiting for a tracking graph
+        return sum(1 for s in self.sessions if s.worker == index and s.graph is None)
+
+    def _submit(self, session, rgb, context):
+        with self.cond:
+            if self.closed or session.closed or session.worker is None:
+                return None
+            if session.pending is not None:
+                session.dropped += 1
+            else:
+                self.queues[session.worker].append(session)
+            session.pending = (rgb, context)
+            session.submitted += 1
+            self.cond.notify_all()
+            return session.submitted
+
+    def _release(self, session):
+        with self.cond:
+            self.sessions.discard(session)
+            session.pending = None
+            if session.worker is not None:
+                self.load[session.worker] -= 1
+                try:
+                    self.queues[session.worker].remove(session)
+                except ValueError:
+                    pass
+            # Its tracking graph goes to the next session of the same worker;
+            # the worker is the only thread that runs it, so it cannot be in
+            # use by anyone else
+            if session.graph is not None:
+                self.idle[session.worker].append(session.graph)
+                session.graph = None
+                for other in self.sessions:
+                    self._lend(other)
+            self.cond.notify_all()
+
+    def _fail(self, index):
+        # Moves the sessions of a worker that could not start to the others
+        with self.cond:
+            self.failed.add(index)
+            self.queues[index].clear()
+            for session in self.sessions:
+                if session.worker != index:
+                    continue
+                self.load[index] -= 1
+                self._pin(session)
+                if session.pending is not None and session.worker is not None:
+                    self.queues[session.worker].append(session)
+            self.cond.notify_all()
+
+    def _next_build(self):
+        # Worker that needs another tracking graph and is under its cap
+        for i in range(self.max_workers):
+            if i in self.failed or self.graphs[i] >= self.graphs_per_worker:
+                continue
+            if self._wanted(i) > len(self.idle[i]):
+                return i
+        return None
+
+    def _builder(self):
+        # Builds tracking graphs one at a time, off the inference loop
+        while True:
+            with self.cond:
+                while not self.closed and self._next_build() is None:
+                    self.cond.wait()
+                if self.closed:
+                    return
+                index = self.building = self._next_build()
+            try:
+                hands = create_hands(**self.options)
+                warm_up(hands)
+            except Exception as e:
+                print(f"[FunDraw_ChemLab] Could not build a hand tracking graph: {e}")
+                with self.cond:
+                    # Sessions keep using the shared graphs
+                    self.building = None
+                    self.graphs_per_worker = 0
+                return
+            with self.cond:
+                self.building = None
+                if self.closed or index in self.failed:
+                    hands.close()
+                    continue
+                self.graphs[index] += 1
+                self.idle[index].append(hands)
+                for session in self.sessions:
+                    self._lend(session)
+                self.cond.notify_all()
+
+    def _worker(self, index):
+        try:
+            shared = create_hands(**dict(self.options, static_image_mode=True))
+            warm_up(shared)
+        except Exception as e:
+            print(f"[FunDraw_ChemLab] Hand tracking worker {index} could not load the hand model: {e}")
+            self._fail(index)
+            return
+        with self.cond:
+            self.warm += 1
+
+        try:
+            while True:
+                with self.cond:
+                    queue = self.queues[index]
+                    while not queue and not self.closed:
+                        self.cond.wait()
+                    if self.closed:
+                        return
+                    session = queue.popleft()
+                    (rgb, context), seq = session.pending, session.submitted
+                    session.pending = None
+                    hands = session.graph or shared
+                    self.busy += 1
+
+                try:
+                    result = hands.process(rgb)
+                except Exception as e:
+                    print(f"[FunDraw_ChemLab] Hand inference failed: {e}")
+                    result = NO_HANDS
+                finally:
+                    with self.cond:
+                        self.busy -= 1
+
+                session._deliver(SimpleNamespace(multi_hand_landmarks=result.multi_hand_landmarks,
+                                                 multi_handedness=result.multi_handedness,
+                                                 context=context), seq)
+        finally:
+            with self.cond:
+                graphs = self.idle[index] + [s.graph for s in self.sessions
+                                             if s.worker == index and s.graph is not None]
+                self.idle[index] = []
+                for s in self.sessions:
+                    if s.worker == index:
+                        s.graph = None
+            for hands in [shared] + graphs:
+                hands.close()
+
+    def stats(self):
+        with self.cond:
+            graphs = self.warm + sum(self.graphs)
+            return {
+                "workers": self.max_workers,
+                "busy": self.busy,
+                "warm": self.warm,
+                "failed": len(self.failed),
+                "queued": sum(len(q) for q in self.queues),
+                "sessions": len(self.sessions),
+                "tracking": sum(1 for s in self.sessions if s.graph is not None),
+                "graphs": graphs,
+                "memory_mb": round(graphs * GRAPH_BYTES / 1e6, 1),
+                "dropped": sum(s.dropped for s in self.sessions),
+            }
+
+    def close(self, wait=True):
+        # With wait, returns once the workers have closed their graphs
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        if wait:
+            for t in self.workers + ([self.builder] if self.builder else []):
+                t.join(timeout=5.0)
+
+def tracker_graphs(tracker):
+    # Graphs held for one tracker: its own, or the tracking graph a pool lent
+    # it (the pool's shared graphs are reported by HandTrackingPool.stats)
+    if isinstance(tracker, LocalHandTracker):
+        return 1 if tracker.hands is not None else 0
+    if isinstance(tracker, PooledHandTracker):
+        return 1 if tracker.graph is not None else 0
+    if isinstance(tracker, RecordingHandTracker):
+        return tracker_graphs(tracker.tracker)
+    return 0
+
+class PooledHandTracker:
+    # Per-session handle on a HandTrackingPool, with the session's own light
+    # state (pinned worker, lent tracking graph, latest result and frame
+    # counters). process() takes an optional context (e.g. the crop the input
+    # was cut from) that comes back as result.context, so a result that
+    # arrives after its frame timed out is still interpreted against the frame
+    # it came from. Each result is returned at most once.
+
+    # process() can time out while the frame is still queued, so callers must
+    # not reuse the input buffer
+    retains_input = True
+    # process() takes the context of its input (see above)
+    takes_context = True
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.worker = None
+        self.graph = None
+        self.cond = threading.Condition()
+        self.pending = None
+        self.submitted = 0
+        self.completed = 0
+        self.returned = 0
+        self.dropped = 0
+        self.result = NO_HANDS
+        self.closed = False
+
+    def process(self, rgb, context=None):
+        seq = self.pool._submit(self, rgb, context)
+        if seq is None:
+            return NO_HANDS
+        with self.cond:
+            self.cond.wait_for(lambda: self.completed >= seq, timeout=self.pool.max_wait)
+            if self.completed <= self.returned:
+                return STALE
+            self.returned = self.completed
+            return self.result
+
+    def _deliver(self, result, seq):
+        with self.cond:
+            if seq > self.completed:
+                self.result = result
+                self.completed = seq
+            self.cond.notify_all()
+
+    def close(self):
+        self.closed = True
+        self.pool._release(self)
+
+# Landmarks the gesture handlers actually consume (thumb tip, index tip). On
+# frames where inference is skipped only these are extrapolated.
+TRACKED_LANDMARKS = (4, 8)
+
+# Bones of the 21-landmark hand, as in MediaPipe's HAND_CONNECTIONS
+HAND_CONNECTIONS = (
+    (0, 1), (1, 2), (2, 3), (3, 4),
+    (0, 5), (5, 6), (6, 7), (7, 8),
+    (5, 9), (9, 10), (10, 11), (11, 12),
+    (9, 13), (13, 14), (14, 15), (15, 16),
+    (13, 17), (0, 17), (17, 18), (18, 19), (19, 20),
+)
+
+def draw_hand_landmarks(frame, hand_landmarks):
+    # Skeleton in the style of MediaPipe's draw_landmarks defaults, without
+    # importing MediaPipe, so scripted landmarks can be drawn without a model.
+    # Landmarks outside the frame are skipped.
+    h, w = frame.shape[:2]
+    pts = []
+    for lm in hand_landmarks.landmark:
+        inside = 0.0 <= lm.x <= 1.0 and 0.0 <= lm.y <= 1.0
+        pts.append((min(int(lm.x * w), w - 1), min(int(lm.y * h), h - 1)) if inside else None)
+    for a, b in HAND_CONNECTIONS:
+        if a < len(pts) and b < len(pts) and pts[a] is not None and pts[b] is not None:
+            cv2.line(frame, pts[a], pts[b], (224, 224, 224), 2)
+    for pt in pts:
+        if pt is not None:
+            cv2.circle(frame, pt, 3, (224, 224, 224), 2)
+            cv2.circle(frame, pt, 2, (0, 0, 255), 2)
+
+class MotionDetector:
+    # Cheap global motion score: mean absolute difference between tiny
+    # grayscale thumbnails of consecutive frames (0-255 scale)
+    def __init__(self, size=(32, 18)):
+        self.size = size
+        self.prev = None
+
+    def score(self, frame):
+        thumb = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        thumb = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY)
+        prev, self.prev = self.prev, thumb
+        if prev is None:
+            return 255.0
+        return float(cv2.absdiff(thumb, prev).mean())
+
+class HoldPredictor:
+    # Reuses the last observed positions unchanged
+    def __init__(self):
+        self.points = None
+        self.time = None
+
+    def reset(self):
+        self.points = None
+        self.time = None
+
+    def observe(self, points, t):
+        self.points = np.asarray(points, dtype=np.float32)
+        self.time = t
+
+    def predict(self, t):
+        return self.points
+
+class ConstantVelocityPredictor(HoldPredictor):
+    # Extrapolates from the velocity between the last two observations,
+    # for at most max_horizon seconds past the last one
+    def __init__(self, max_horizon=0.25):
+        super().__init__()
+        self.velocity = None
+        self.max_horizon = max_horizon
+
+    def reset(self):
+        super().reset()
+        self.velocity = None
+
+    def observe(self, points, t):
+        points = np.asarray(points, dtype=np.float32)
+        if self.points is not None and t > self.time:
+            self.velocity = (points - self.points) / (t - self.time)
+        self.points = points
+        self.time = t
+
+    def predict(self, t):
+        if self.points is None or self.velocity is None:
+            return self.points
+        dt = min(max(0.0, t - self.time), self.max_horizon)
+        return self.points + self.velocity * dt
+
+class KalmanPredictor(HoldPredictor):
+    # Constant-velocity Kalman filter. Every coordinate follows the same model
+    # and is observed at the same instants, so one 2x2 covariance is shared and
+    # the state update is vectorized over all points.
+    def __init__(self, process_noise=4000.0, measurement_noise=4.0, max_horizon=0.25):
+        super().__init__()
+        self.q = process_noise
+        self.r = measurement_noise
+        self.max_horizon = max_horizon
+        self.velocity = None
+        self.cov = None
+
+    def reset(self):
+        super().reset()
+        self.velocity = None
+        self.cov = None
+
+    def _propagate(self, cov, dt):
+        f = np.array([[1.0, dt], [0.0, 1.0]])
+        q = self.q * np.array([[dt ** 4 / 4, dt ** 3 / 2], [dt ** 3 / 2, dt ** 2]])
+        return f @ cov @ f.T + q
+
+    def observe(self, points, t):
+        z = np.asarray(points, dtype=np.float32)
+        if self.points is None:
+            self.points = z
+            self.velocity = np.zeros_like(z)
+            self.cov = np.diag([self.r, 1e4])
+            self.time = t
+            return
+
+        dt = max(1e-3, t - self.time)
+        predicted = self.points + self.velocity * dt
+        cov = self._propagate(self.cov, dt)
+
+        # Gain for a position-only measurement
+        s = cov[0, 0] + self.r
+        k_pos, k_vel = cov[0, 0] / s, cov[1, 0] / s
+        innovation = z - predicted
+        self.points = predicted + k_pos * innovation
+        self.velocity = self.velocity + k_vel * innovation
+        self.cov = (np.eye(2) - np.array([[k_pos, 0.0], [k_vel, 0.0]])) @ cov
+        self.time = t
+
+    def predict(self, t):
+        if self.points is None:
+            return None
+        dt = min(max(0.0, t - self.time), self.max_horizon)
+        return self.points + self.velocity * dt
+
+def create_predictor(kind):
+    # kind: "velocity", "kalman", "hold"/None, or a predictor instance
+    if kind is None or kind == "hold":
+        return HoldPredictor()
+    if kind == "velocity":
+        return ConstantVelocityPredictor()
+    if kind == "kalman":
+        return KalmanPredictor()
+    if isinstance(kind, str):
+        raise ValueError(f"Unknown landmark predictor: {kind}")
+    return kind
+
+class InferencePreprocessor:
+    # Builds the model input from a BGR frame. With inference_width set, the
+    # input is downscaled so it is at most that wide. With roi_crop enabled and
+    # a confident previous detection, only a box around the last landmarks is
+    # sent, padded by the hand size and by how far the hand moves in
+    # roi_lookahead seconds. Landmarks are mapped back with map_landmarks.
+    # With reuse_buffers, the resized and RGB images are written into buffers
+    # kept across frames; only safe when the tracker is done with its input
+    # by the time process() returns.
+    def __init__(self, inference_width=None, roi_crop=False, roi_min_confidence=0.9,
+                 roi_padding=0.5, roi_lookahead=0.1, roi_min_size=160, reuse_buffers=True):
+        self.inference_width = inference_width
+        self.reuse_buffers = reuse_buffers
+        self.buffers = {}
+        self.roi_crop = roi_crop
+        self.roi_min_confidence = roi_min_confidence
+        self.roi_padding = roi_padding
+        self.roi_lookahead = roi_lookahead
+        self.roi_min_size = roi_min_size
+        self.reset()
+
+    def reset(self):
+        self.roi = None
+        self.center = None
+        self.center_time = None
+        self.velocity = (0.0, 0.0)
+
+    def observe(self, pts, confidence, t, w, h):
+        # pts are full-frame pixel landmarks from the latest detection
+        pts = np.asarray(pts, dtype=np.float32)
+        x1, y1 = pts.min(axis=0)
+        x2, y2 = pts.max(axis=0)
+        center = ((x1 + x2) / 2, (y1 + y2) / 2)
+        if self.center is not None and t > self.center_time:
+            dt = t - self.center_time
+            self.velocity = ((center[0] - self.center[0]) / dt, (center[1] - self.center[1]) / dt)
+        self.center, self.center_time = center, t
+
+        if not self.roi_crop or confidence is None or confidence < self.roi_min_confidence:
+            self.roi = None
+            return
+
+        half = max(max(x2 - x1, y2 - y1) * (0.5 + self.roi_padding), self.roi_min_size / 2)
+        pad_x = abs(self.velocity[0]) * self.roi_lookahead
+        pad_y = abs(self.velocity[1]) * self.roi_lookahead
+        rx1 = int(max(0, center[0] - half - pad_x))
+        ry1 = int(max(0, center[1] - half - pad_y))
+        rx2 = int(min(w, center[0] + half + pad_x))
+        ry2 = int(min(h, center[1] + half + pad_y))
+        self.roi = (rx1, ry1, rx2 - rx1, ry2 - ry1) if rx2 > rx1 and ry2 > ry1 else None
+
+    def prepare(self, frame):
+        # Returns (rgb, crop) where crop = (x, y, w, h) in frame pixels
+        h, w = frame.shape[:2]
+        crop = self.roi if self.roi is not None else (0, 0, w, h)
+        x, y, cw, ch = crop
+        src = frame[y:y + ch, x:x + cw]
+
+        if self.inference_width is not None and cw > self.inference_width:
+            size = self.input_size(cw, ch)
+            src = cv2.resize(src, size, dst=self.buffer("small", (size[1], size[0], 3)),
+                             interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(src, cv2.COLOR_BGR2RGB, dst=self.buffer("rgb", src.shape)), crop
+
+    def input_size(self, w, h):
+        # (width, height) of the model input for a w x h source
+        if self.inference_width is None or w <= self.inference_width:
+            return (w, h)
+        scale = self.inference_width / w
+        return (self.inference_width, max(1, int(round(h * scale))))
+
+    def buffer(self, name, shape):
+        # A contiguous view of one flat buffer per name that only ever grows
+        # (at least doubling), so ROI crops whose size changes every
+        # detection still reuse it
+        if not self.reuse_buffers:
+            return None
+        size = int(np.prod(shape))
+        buf = self.buffers.get(name)
+        if buf is None or buf.size < size:
+            capacity = size if buf is None else max(size, 2 * buf.size)
+            buf = self.buffers[name] = np.empty(capacity, dtype=np.uint8)
+        return buf[:size].reshape(shape)
+
+    def map_landmarks(self, hand_landmarks, crop, w, h, mirrored=False):
+        return map_landmarks(hand_landmarks, crop, w, h, mirrored)
+
+def map_landmarks(hand_landmarks, crop, w, h, mirrored=False):
+    # Returns the landmarks in normalized frame coordinates, given normalized
+    # crop coordinates. mirrored: the input was the unflipped camera image.
+    # Tracker results are never modified: pooled trackers can hand out the
+    # same result object more than once. Mapped landmarks are plain objects
+    # with x, y and z, which is all the painter reads.
+    x, y, cw, ch = crop
+    full = (x, y, cw, ch) == (0, 0, w, h)
+    if full and not mirrored:
+        return hand_landmarks
+    mapped = []
+    for lm in hand_landmarks.landmark:
+        lx, ly, lz = lm.x, lm.y, getattr(lm, "z", 0.0)
+        if mirrored:
+            lx = 1.0 - lx
+        if not full:
+            lx = (x + lx * cw) / w
+            ly = (y + ly * ch) / h
+            lz = lz * cw / w
+        mapped.append(SimpleNamespace(x=lx, y=ly, z=lz))
+    return SimpleNamespace(landmark=mapped)
+
+def hand_confidence(results):
+    try:
+        return results.multi_handedness[0].classification[0].score
+    except (AttributeError, IndexError, TypeError):
+        return None
+
+class ScriptedHandTracker:
+    # Replays a recorded landmark track instead of running a model. The track
+    # is a list with one entry per frame: None (no hand) or 21 (x, y) pairs in
+    # normalized coordinates of the mirrored frame. It loops when exhausted.
+    # Landmarks are plain objects, so no model or MediaPipe install is needed.
+    def __init__(self, track):
+        self.track = track
+        self.index = 0
+
+    @staticmethod
+    def load(path):
+        with open(path) as f:
+            data = json.load(f)
+        return ScriptedHandTracker(data["frames"] if isinstance(data, dict) else data)
+
+    def process(self, rgb):
+        if not self.track:
+            return NO_HANDS
+        points = self.track[self.index % len(self.track)]
+        self.index += 1
+        if points is None:
+            return NO_HANDS
+
+        hand_landmarks = SimpleNamespace(landmark=[SimpleNamespace(x=float(x), y=float(y), z=0.0)
+                                                   for x, y in points])
+        return SimpleNamespace(multi_hand_landmarks=[hand_landmarks], multi_handedness=None)
+
+    def close(self):
+        pass
+
+class RecordingHandTracker:
+    # Wraps another tracker and keeps every result as a replayable track. The
+    # painter passes the context of each input (crop, frame size, mirrored),
+    # so landmarks detected on an ROI crop or the unflipped decoder input are
+    # recorded in normalized coordinates of the full mirrored frame, as
+    # ScriptedHandTracker expects.
+    takes_context = True
+
+    def __init__(self, tracker):
+        self.tracker = tracker
+        self.track = []
+        self.retains_input = getattr(tracker, "retains_input", False)
+
+    def process(self, rgb, context=None):
+        if getattr(self.tracker, "takes_context", False):
+            results = self.tracker.process(rgb, context)
+        else:
+            results = self.tracker.process(rgb)
+        if results is STALE:
+            self.track.append(self.track[-1] if self.track else None)
+        elif results.multi_hand_landmarks:
+            # An asynchronous result may belong to an earlier input
+            context = getattr(results, "context", None) or context
+            hand_landmarks = results.multi_hand_landmarks[0]
+            if context is not None:
+                hand_landmarks = map_landmarks(hand_landmarks, *context)
+            self.track.append([[round(lm.x, 5), round(lm.y, 5)] for lm in hand_landmarks.landmark])
+        else:
+            self.track.append(None)
+        return results
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({"frames": self.track}, f)
+
+    def close(self):
+        self.tracker.close()
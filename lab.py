@@ -0,0 +1,147 @@
+import cv2
+import numpy as np
+
+from overlay import Sprite
+
+EMPTY_COLOR = (100, 100, 100)
+
+class Beaker:
+    # Lab beaker whose contents are a catalog ID mask plus a running colour
+    # sum. Everything drawn for it (outline, contents, names, label) is
+    # cached as one sprite and rebuilt only when the contents or the
+    # position change.
+    def __init__(self, label, pos=(0, 0), radius=60):
+        self.label = label
+        self.pos = pos
+        self.radius = radius
+        self.chemicals = []
+        self.mask = 0
+        self.color_sum = np.zeros(3, np.int32)
+        self.sprite = None
+
+    def add(self, chemical, catalog):
+        # Returns False if the beaker already holds the chemical
+        cid = catalog.id(chemical)
+        if cid is None or self.mask >> cid & 1:
+            return False
+        self.mask |= 1 << cid
+        self.color_sum += catalog.colors[cid]
+        self.chemicals.append(chemical)
+        self.sprite = None
+        return True
+
+    def empty(self):
+        self.chemicals = []
+        self.mask = 0
+        self.color_sum[:] = 0
+        self.sprite = None
+
+    def move(self, pos):
+        if pos != self.pos:
+            self.pos = pos
+            self.sprite = None
+
+    @property
+    def mixed_color(self):
+        count = len(self.chemicals)
+        if not count:
+            return EMPTY_COLOR
+        b, g, r = self.color_sum // count
+        return (int(b), int(g), int(r))
+
+    def contains(self, x, y):
+        return (x - self.pos[0]) ** 2 + (y - self.pos[1]) ** 2 <= self.radius ** 2
+
+    def draw(self, frame):
+        if self.sprite is None:
+            self.sprite, self.origin = self.build()
+        self.sprite.draw(frame, *self.origin)
+
+    def build(self):
+        x, y = self.pos
+        radius = self.radius
+        label_w = cv2.getTextSize(self.label, cv2.FONT_HERSHEY_SIMPLEX, 0.55, 2)[0][0]
+        names_w = 0
+        for chem in self.chemicals:
+            names_w = max(names_w, cv2.getTextSize(chem[:10], cv2.FONT_HERSHEY_SIMPLEX, 0.4, 1)[0][0])
+        left = x - max(radius + 2, 42)
+        right = x + max(radius + 3, label_w - 40 + 3, names_w - 40 + 2)
+        top = y - radius - 30 - len(self.chemicals) * 18
+        bottom = y + radius + 40
+
+        def render(img):
+            self.render(img, (x - left, y - top))
+
+        return Sprite((right - left, bottom - top), render), (left, top)
+
+    def render(self, img, pos):
+        radius = self.radius
+
+        # Beaker outline with better styling
+        cv2.circle(img, pos, radius, (180, 180, 180), 3)
+        cv2.circle(img, pos, radius - 5, (120, 120, 120), 2)
+        
+        # Beaker base
+        base_rect = (pos[0] - radius + 10, pos[1] + radius - 15, 
+                    pos[0] + radius - 10, pos[1] + radius + 5)
+        cv2.rectangle(img, (base_rect[0], base_rect[1]), (base_rect[2], base_rect[3]), 
+                     (150, 150, 150), 2)
+        
+        # Beaker contents (mixed chemical colors)
+        if self.chemicals:
+            cv2.circle(img, (pos[0], pos[1] + 12), radius - 12, self.mixed_color, -1)
+            
+            # Chemical names in beaker - better formatting
+            y_offset = pos[1] - radius - 15
+            for j, chem in enumerate(self.chemicals):
+                cv2.putText(img, chem[:10], (pos[0] - 40, y_offset - j * 18),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1, cv2.LINE_AA)
+        
+        # Beaker label with better styling
+        cv2.putText(img, self.label, (pos[0] - 40, pos[1] + radius + 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.55, (220, 220, 220), 2, cv2.LINE_AA)
+
+def wrap_text(text, max_chars_per_line):
+    words = text.split()
+    lines = []
+    current_line = ""
+    
+    for word in words:
+        if len(current_line + word) < max_chars_per_line:
+            current_line += word + " "
+        else:
+            lines.append(current_line.strip())
+            current_line = word + " "
+    if current_line:
+        lines.append(current_line.strip())
+    return lines
+
+class EducationalPanel:
+    # Reaction explanation box at the bottom of the lab. The wrapped text
+    # and the rendered panel are cached per (text, frame size).
+    def __init__(self):
+        self.key = None
+        self.sprite = None
+
+    def draw(self, frame, text):
+        h, w = frame.shape[:2]
+        key = (text, w, h)
+        if key != self.key:
+            self.sprite = self.build(text, w)
+            self.key = key
+        self.sprite.draw(frame, 0, h - 186)
+
+    def build(self, text, w):
+        # Max 3 lines, adaptive line length based on screen width
+        lines = wrap_text(text, min(90, w // 10))[:3]
+
+        def render(img):
+            # Panel-local coordinates: text_y is 140 rows above the frame bottom
+            text_y = 46
+            cv2.rectangle(img, (15, text_y - 45), (w - 15, 171), (30, 30, 30), -1)
+            cv2.rectangle(img, (15, text_y - 45), (w - 15, 171), (100, 255, 100), 2)
+            for i, line in enumerate(lines):
+                cv2.putText(img, line, (25, text_y - 25 + i * 22),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (120, 255, 120), 1, cv2.LINE_AA)
+
+        return Sprite((w, 174), render)
@@ -0,0 +1,111 @@
+import cv2
+import numpy as np
+
+# Screen geometry shared by the toolbar/lab rendering and gesture hit testing.
+# Codes in the toolbar label map: 0 nothing, 1 the mode button, 2 + i card i.
+MODE_TARGET = 1
+CARD_BASE = 2
+
+MODE_BUTTON_SIZE = (160, 40)
+CARD_HEIGHT = 80
+# Rows covered by the floating instruction pill (see Overlay.build_pill)
+PILL_HEIGHT = 41
+
+TOOLBAR_STYLES = {
+    "PAINTER": {"kind": "color", "spacing": 15, "max_width": 100},
+    "CHEMISTRY": {"kind": "chemical", "spacing": 10, "max_width": 110},
+}
+
+class UILayout:
+    # Everything placed on screen for one frame size. The draw code reads its
+    # rectangles from here, and hit testing looks the fingertip up in label
+    # maps rendered from the same rectangles, so a target is found in O(1)
+    # however many cards or beakers there are.
+    def __init__(self, w, h, toolbar_height, instruction_height, slot_counts, beaker_radii):
+        self.size = (w, h)
+        self.slot_counts = dict(slot_counts)
+        self.header_height = toolbar_height + 25
+        self.pill_y = h - 50
+        # Row bands the toolbar layer draws into: the header with its bottom
+        # border, and the instruction pill
+        self.toolbar_rows = [(0, self.header_height + 1), (self.pill_y, self.pill_y + PILL_HEIGHT)]
+
+        bw, bh = MODE_BUTTON_SIZE
+        self.mode_button = (w - bw - 20, 20, w - 20, 20 + bh)
+        self.cards = {mode: self.layout_cards(w, n, TOOLBAR_STYLES[mode])
+                      for mode, n in self.slot_counts.items()}
+        self.toolbar_maps = {mode: self.toolbar_map(mode) for mode in self.cards}
+
+        # Beakers sit in a row halfway down the lab area, above the space
+        # reserved for the educational text
+        lab_start_y = toolbar_height + instruction_height
+        lab_height = h - lab_start_y - 150
+        beaker_y = lab_start_y + lab_height // 2
+        spacing = (w - 200) // (len(beaker_radii) + 1)
+        self.beakers = [(100 + spacing * (i + 1), beaker_y) for i in range(len(beaker_radii))]
+        self.beaker_radii = list(beaker_radii)
+        self.beaker_map, self.beaker_map_y = self.build_beaker_map()
+
+    def matches(self, w, h, slot_counts):
+        return self.size == (w, h) and self.slot_counts == slot_counts
+
+    def layout_cards(self, w, slots, style):
+        if slots == 0:
+            return []
+        available_width = w - MODE_BUTTON_SIZE[0] - 60
+        spacing = style["spacing"]
+        card_width = int((available_width - (slots + 1) * spacing) / slots)
+        card_width = min(card_width, style["max_width"])
+        start_x, start_y = 20, 15
+        cards = []
+        for i in range(slots):
+            x1 = start_x + i * (card_width + spacing)
+            cards.append((x1, start_y, x1 + card_width, start_y + CARD_HEIGHT))
+        return cards
+
+    def toolbar_map(self, mode):
+        # Targets span the whole header band vertically, so a fingertip a
+        # little above or below a card still selects it
+        w = self.size[0]
+        label = np.zeros((self.header_height, w), dtype=np.int16)
+        x1, _, x2, _ = self.mode_button
+        label[:, max(0, x1):min(w, x2 + 1)] = MODE_TARGET
+        for i, (x1, _, x2, _) in enumerate(self.cards[mode]):
+            label[:, max(0, x1):min(w, x2 + 1)] = CARD_BASE + i
+        return label
+
+    def build_beaker_map(self):
+        # Label map covering only the rows the beakers span; earlier beakers
+        # win where circles overlap
+        if not self.beakers:
+            return np.zeros((0, self.size[0]), dtype=np.uint8), 0
+        y1 = max(0, min(y - r for (_, y), r in zip(self.beakers, self.beaker_radii)))
+        y2 = min(self.size[1], max(y + r for (_, y), r in zip(self.beakers, self.beaker_radii)) + 1)
+        label = np.zeros((max(0, y2 - y1), self.size[0]), dtype=np.uint8)
+        for i in reversed(range(len(self.beakers))):
+            x, y = self.beakers[i]
+            cv2.circle(label, (x, y - y1), self.beaker_radii[i], i + 1, -1)
+        return label, y1
+
+    def toolbar_target(self, mode, x, y):
+        # Returns ("mode", None), (kind, idx) or None
+        x, y = int(x), int(y)
+        if not (0 <= y < self.header_height and 0 <= x < self.size[0]):
+            return None
+        code = int(self.toolbar_maps[mode][y, x])
+        if code == MODE_TARGET:
+            return ("mode", None)
+        if code >= CARD_BASE:
+            return (TOOLBAR_STYLES[mode]["kind"], code - CARD_BASE)
+        return None
+
+    def beaker_at(self, x, y):
+        x, y = int(x), int(y) - self.beaker_map_y
+        if not (0 <= y < self.beaker_map.shape[0] and 0 <= x < self.size[0]):
+            return None
+        code = int(self.beaker_map[y, x])
+        return code - 1 if code else None
+
+    def card_center(self, mode, idx):
+        x1, y1, x2, y2 = self.cards[mode][idx]
+        return ((x1 + x2) // 2, (y1 + y2) // 2)
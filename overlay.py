@@ -0,0 +1,222 @@
+import cv2
+import numpy as np
+
+def draw_rounded_rect(img, pt1, pt2, color, thickness=1, radius=10, filled=False):
+    x1, y1 = pt1
+    x2, y2 = pt2
+    
+    # Clamp radius
+    w = x2 - x1
+    h = y2 - y1
+    radius = min(radius, w//2, h//2)
+    
+    # Corners
+    corners = [
+        ((x1 + radius, y1 + radius), 180, 270), # Top-left
+        ((x2 - radius, y1 + radius), 270, 360), # Top-right
+        ((x2 - radius, y2 - radius), 0, 90),    # Bottom-right
+        ((x1 + radius, y2 - radius), 90, 180)   # Bottom-left
+    ]
+    
+    if filled:
+        # Draw filled rectangle with rounded corners hack
+        # Center rect
+        cv2.rectangle(img, (x1 + radius, y1), (x2 - radius, y2), color, -1)
+        # Side rects
+        cv2.rectangle(img, (x1, y1 + radius), (x1 + radius, y2 - radius), color, -1)
+        cv2.rectangle(img, (x2 - radius, y1 + radius), (x2, y2 - radius), color, -1)
+        # Corner circles
+        cv2.circle(img, (x1 + radius, y1 + radius), radius, color, -1)
+        cv2.circle(img, (x2 - radius, y1 + radius), radius, color, -1)
+        cv2.circle(img, (x2 - radius, y2 - radius), radius, color, -1)
+        cv2.circle(img, (x1 + radius, y2 - radius), radius, color, -1)
+    else:
+        # Draw outline
+        # Lines
+        cv2.line(img, (x1 + radius, y1), (x2 - radius, y1), color, thickness)
+        cv2.line(img, (x1 + radius, y2), (x2 - radius, y2), color, thickness)
+        cv2.line(img, (x1, y1 + radius), (x1, y2 - radius), color, thickness)
+        cv2.line(img, (x2, y1 + radius), (x2, y2 - radius), color, thickness)
+        # Arcs
+        for center, start_angle, end_angle in corners:
+            cv2.ellipse(img, center, (radius, radius), 0, start_angle, end_angle, color, thickness)
+
+CHANNEL_MEAN = np.full((1, 3), 1.0 / 3.0)
+# Per-pixel sum over channels, saturating for uint8 input
+CHANNEL_SUM = np.ones((1, 3))
+
+def affine_layer(on_black, on_white):
+    # A drawing made of opaque and fixed-alpha primitives is affine in the
+    # underlying pixel: out = under * k + layer * (1 - k). Rendering it once
+    # over black and once over white recovers k and the layer exactly.
+    a = on_black.astype(np.float32)
+    # Channel mean with cv2.transform; numpy reductions over the channel axis
+    # are several times slower
+    k = cv2.transform(on_white.astype(np.float32) - a, CHANNEL_MEAN / 255.0)
+    np.clip(k, 0.0, 1.0, out=k)
+    layer_weight = 1.0 - k
+    safe = np.maximum(layer_weight, 1e-3)[..., None]
+    layer = np.clip(a / safe, 0, 255)
+    layer[layer_weight < 1e-3] = 0
+    return layer.astype(np.uint8), k, layer_weight
+
+class Sprite:
+    # Pre-rendered element. When few pixels are partially covered (mostly
+    # opaque shapes with antialiased edges), opaque pixels are copied through
+    # a mask and only the partial ones are blended, as out = frame * k +
+    # on_black. Translucent sprites use a single cv2.blendLinear instead.
+    def __init__(self, size, render_fn):
+        w, h = size
+        on_black = np.zeros((h, w, 3), dtype=np.uint8)
+        on_white = np.full((h, w, 3), 255, dtype=np.uint8)
+        render_fn(on_black)
+        render_fn(on_white)
+        self.layer, self.frame_weight, self.layer_weight = affine_layer(on_black, on_white)
+        self.size = size
+
+        k = self.frame_weight
+        self.opaque = (k < 1e-3).astype(np.uint8)
+        ys, xs = np.nonzero((k >= 1e-3) & (k < 0.999))
+        self.partial = (ys, xs, k[ys, xs, None], on_black[ys, xs].astype(np.float32) + 0.5)
+        self.sparse = len(ys) * 8 < w * h
+
+    def draw(self, frame, x, y):
+        w, h = self.size
+        fh, fw = frame.shape[:2]
+        x1, y1 = max(0, x), max(0, y)
+        x2, y2 = min(fw, x + w), min(fh, y + h)
+        if x1 >= x2 or y1 >= y2:
+            return
+        roi = frame[y1:y2, x1:x2]
+        if self.sparse and (x2 - x1, y2 - y1) == (w, h):
+            cv2.copyTo(self.layer, self.opaque, roi)
+            ys, xs, k, a = self.partial
+            if len(ys):
+                roi[ys, xs] = np.minimum(roi[ys, xs] * k + a, 255)
+            return
+
+        # Translucent, or clipped by the frame edge: blend the visible part
+        sx, sy = x1 - x, y1 - y
+        sl = (slice(sy, sy + y2 - y1), slice(sx, sx + x2 - x1))
+        cv2.blendLinear(roi, self.layer[sl], self.frame_weight[sl], self.layer_weight[sl], dst=roi)
+
+class Overlay:
+    # Translucent UI primitives blended only within their own bounding box.
+    # Shapes are drawn into a reusable scratch buffer that grows to the
+    # largest ROI seen; pills are cached as sprites keyed by their text.
+    def __init__(self, max_sprites=32):
+        self.scratch = np.zeros((1, 1, 3), dtype=np.uint8)
+        self.sprites = {}
+        self.max_sprites = max_sprites
+
+    def clip(self, frame, pt1, pt2):
+        h, w = frame.shape[:2]
+        x1, y1 = max(0, pt1[0]), max(0, pt1[1])
+        x2, y2 = min(w, pt2[0]), min(h, pt2[1])
+        if x1 >= x2 or y1 >= y2:
+            return None
+        return x1, y1, x2, y2
+
+    def scratch_roi(self, h, w):
+        sh, sw = self.scratch.shape[:2]
+        if sh < h or sw < w:
+            self.scratch = np.zeros((max(h, sh), max(w, sw), 3), dtype=np.uint8)
+        return self.scratch[:h, :w]
+
+    def fill_rect(self, frame, pt1, pt2, color, alpha):
+        # pt2 is exclusive
+        box = self.clip(frame, pt1, pt2)
+        if box is None:
+            return
+        x1, y1, x2, y2 = box
+        roi = frame[y1:y2, x1:x2]
+        tmp = self.scratch_roi(y2 - y1, x2 - x1)
+        tmp[:] = color
+        cv2.addWeighted(roi, 1 - alpha, tmp, alpha, 0, dst=roi)
+
+    def rounded_rect(self, frame, pt1, pt2, color, alpha, radius=10):
+        box = self.clip(frame, pt1, (pt2[0] + 1, pt2[1] + 1))
+        if box is None:
+            return
+        x1, y1, x2, y2 = box
+        roi = frame[y1:y2, x1:x2]
+        tmp = self.scratch_roi(y2 - y1, x2 - x1)
+        np.copyto(tmp, roi)
+        draw_rounded_rect(tmp, (pt1[0] - x1, pt1[1] - y1), (pt2[0] - x1, pt2[1] - y1),
+                          color, radius=radius, filled=True)
+        cv2.addWeighted(roi, 1 - alpha, tmp, alpha, 0, dst=roi)
+
+    def pill(self, frame, text, center_x, y, font_scale=0.6, alpha=0.6):
+        key = (text, font_scale, alpha)
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            sprite = self.build_pill(text, font_scale, alpha)
+            if len(self.sprites) >= self.max_sprites:
+                self.sprites.pop(next(iter(self.sprites)))
+            self.sprites[key] = sprite
+        sprite.draw(frame, center_x - sprite.size[0] // 2, y)
+
+    def build_pill(self, text, font_scale, alpha):
+        text_size = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, 1)[0]
+        pill_w = text_size[0] + 40
+        pill_h = 40
+
+        def render(img):
+            self.rounded_rect(img, (0, 0), (pill_w, pill_h), (0, 0, 0), alpha, radius=20)
+            cv2.putText(img, text, (20, 28),
+                        cv2.FONT_HERSHEY_SIMPLEX, font_scale, (255, 255, 255), 1, cv2.LINE_AA)
+
+        return Sprite((pill_w + 1, pill_h + 1), render)
+
+class ToolbarLayerCache:
+    # Pre-rendered static UI layer (toolbar cards, header glass, instruction pill),
+    # decomposed with affine_layer and composited as one blend per changed band
+    # of rows. render_fn may only draw within the given row bands: only those
+    # rows are analysed, and reset in the black/white buffers kept for the
+    # next rebuild.
+    def __init__(self):
+        self.key = None
+        self.bands = []
+        self.on_black = None
+        self.on_white = None
+
+    def invalidate(self):
+        self.key = None
+        self.bands = []
+
+    def composite(self, frame, key, render_fn, rows):
+        if key != self.key:
+            self.bands = self.build(frame.shape, render_fn, rows)
+            self.key = key
+
+        for y1, y2, x1, x2, layer, frame_weight, layer_weight in self.bands:
+            roi = frame[y1:y2, x1:x2]
+            cv2.blendLinear(roi, layer, frame_weight, layer_weight, dst=roi)
+
+    def build(self, shape, render_fn, rows):
+        if self.on_black is None or self.on_black.shape != shape:
+            self.on_black = np.zeros(shape, dtype=np.uint8)
+            self.on_white = np.full(shape, 255, dtype=np.uint8)
+        on_black, on_white = self.on_black, self.on_white
+        render_fn(on_black)
+        render_fn(on_white)
+
+        bands = []
+        for y1, y2 in rows:
+            y1, y2 = max(0, y1), min(shape[0], y2)
+            if y1 >= y2:
+                continue
+            black, white = on_black[y1:y2], on_white[y1:y2]
+            # Pixels the layer touched differ by less than 255 between the
+            # two renders, or are not black over black
+            touched = cv2.bitwise_or(cv2.bitwise_not(cv2.absdiff(white, black)), black)
+            changed = cv2.transform(touched, CHANNEL_SUM)
+            cols = np.flatnonzero(cv2.reduce(changed, 0, cv2.REDUCE_MAX)[0])
+            if len(cols):
+                x1, x2 = cols[0], cols[-1] + 1
+                layer, frame_weight, layer_weight = affine_layer(black[:, x1:x2], white[:, x1:x2])
+                bands.append((y1, y2, int(x1), int(x2), layer,
+                              np.ascontiguousarray(frame_weight), layer_weight))
+            black[:] = 0
+            white[:] = 255
+        return bands
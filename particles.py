@@ -0,0 +1,194 @@
+import numpy as np
+
+# Particle subsystem for the chemistry reaction animations. Particles live in
+# structure-of-arrays NumPy storage bounded by a global budget, physics is one
+# vectorized update per frame, and rasterization stamps every particle of the
+# same radius with a single fancy-indexed write.
+
+# Emitter presets per animation type. Ranges are (low, high) and are sampled
+# uniformly per particle; positions are offsets from the reaction position.
+#   rate: particles/second   life: seconds   accel: (ax, ay) px/s^2
+#   fade: scale rate and size by (1 - progress)
+#   rise: spawn point moves up by this many px over the reaction
+#   shrink: radius follows the remaining life fraction
+EMITTER_PRESETS = {
+    'fire': {
+        'rate': 70, 'spawn_x': (-30, 30), 'spawn_y': (-20, 0),
+        'vel_x': (-20, 20), 'vel_y': (-140, -60), 'accel': (0, -40),
+        'life': (0.25, 0.6), 'size': (8, 20),
+        'color': ((0, 100), (100, 200), (200, 255)),
+        'fade': True, 'rise': 40, 'shrink': True,
+    },
+    'blue_fire': {
+        'rate': 60, 'spawn_x': (-20, 20), 'spawn_y': (-15, 0),
+        'vel_x': (-15, 15), 'vel_y': (-110, -40), 'accel': (0, -30),
+        'life': (0.25, 0.5), 'size': (6, 15),
+        'color': ((200, 255), (50, 150), (0, 100)),
+        'fade': True, 'rise': 30, 'shrink': True,
+    },
+    'fizz': {
+        'rate': 90, 'spawn_x': (-40, 40), 'spawn_y': (-10, 10),
+        'vel_x': (-10, 10), 'vel_y': (-160, -70), 'accel': (0, -20),
+        'life': (0.3, 0.7), 'size': (2, 8),
+        'color': ((200, 255), (200, 255), (150, 255)),
+        'hollow': True, 'rise': 50,
+    },
+    'smoke': {
+        'rate': 30, 'spawn_x': (-50, 50), 'spawn_y': (-30, 0),
+        'vel_x': (-30, 30), 'vel_y': (-90, -30), 'accel': (0, -10),
+        'life': (0.8, 1.5), 'size': (5, 20),
+        'color': ((100, 150), (100, 150), (100, 150)),
+        'rise': 60,
+    },
+    'foam': {
+        # Slow, long-lived particles left at the top of a growing column
+        'rate': 60, 'spawn_x': (-20, 20), 'spawn_y': (-5, 5),
+        'vel_x': (-4, 4), 'vel_y': (-6, 2), 'accel': (0, 0),
+        'life': (1.5, 3.0), 'size': (3, 10),
+        'color': ((10, 50), (10, 50), (10, 50)),
+        'rise': 100, 'narrow': True,
+    },
+}
+
+MAX_RADIUS = 24
+
+class ParticleSystem:
+    def __init__(self, capacity=4000, budget=1500, seed=None):
+        self.capacity = capacity
+        self.budget = min(budget, capacity)
+        self.rng = np.random.default_rng(seed)
+
+        self.pos = np.zeros((capacity, 2), dtype=np.float32)
+        self.vel = np.zeros((capacity, 2), dtype=np.float32)
+        self.accel = np.zeros((capacity, 2), dtype=np.float32)
+        self.life = np.zeros(capacity, dtype=np.float32)
+        self.max_life = np.ones(capacity, dtype=np.float32)
+        self.size = np.zeros(capacity, dtype=np.float32)
+        self.color = np.zeros((capacity, 3), dtype=np.uint8)
+        self.hollow = np.zeros(capacity, dtype=bool)
+        self.shrink = np.zeros(capacity, dtype=bool)
+        self.count = 0
+
+        self._stamps = {}
+
+    def clear(self):
+        self.count = 0
+
+    def set_budget(self, budget):
+        self.budget = max(0, min(budget, self.capacity))
+        if self.count > self.budget:
+            self.count = self.budget
+
+    def spawn(self, n, origin, preset, size_scale=1.0, spread=None):
+        n = min(int(n), self.budget - self.count)
+        if n <= 0:
+            return 0
+        rng = self.rng
+        s = slice(self.count, self.count + n)
+        ox, oy = origin
+        self.pos[s, 0] = ox + rng.uniform(*(spread or preset['spawn_x']), n)
+        self.pos[s, 1] = oy + rng.uniform(*preset['spawn_y'], n)
+        self.vel[s, 0] = rng.uniform(*preset['vel_x'], n)
+        self.vel[s, 1] = rng.uniform(*preset['vel_y'], n)
+        self.accel[s] = preset['accel']
+        life = rng.uniform(*preset['life'], n)
+        self.life[s] = life
+        self.max_life[s] = life
+        self.size[s] = rng.uniform(*preset['size'], n) * size_scale
+        for c, (lo, hi) in enumerate(preset['color']):
+            self.color[s, c] = rng.integers(lo, hi + 1, n)
+        self.hollow[s] = preset.get('hollow', False)
+        self.shrink[s] = preset.get('shrink', False)
+        self.count += n
+        return n
+
+    def update(self, dt):
+        n = self.count
+        if n == 0:
+            return
+        self.vel[:n] += self.accel[:n] * dt
+        self.pos[:n] += self.vel[:n] * dt
+        self.life[:n] -= dt
+
+        # Compact survivors to the front, keeping their order
+        alive = self.life[:n] > 0
+        kept = int(alive.sum())
+        if kept < n:
+            for arr in (self.pos, self.vel, self.accel, self.life, self.max_life,
+                        self.size, self.color, self.hollow, self.shrink):
+                arr[:kept] = arr[:n][alive]
+            self.count = kept
+
+    def radii(self):
+        n = self.count
+        r = self.size[:n].copy()
+        shrink = self.shrink[:n]
+        r[shrink] *= self.life[:n][shrink] / self.max_life[:n][shrink]
+        return np.clip(np.rint(r), 0, MAX_RADIUS).astype(np.int32)
+
+    def bounds(self):
+        # (x1, y1, x2, y2) covering every live particle, or None
+        n = self.count
+        if n == 0:
+            return None
+        pad = MAX_RADIUS + 2
+        x1, y1 = np.floor(self.pos[:n].min(axis=0)) - pad
+        x2, y2 = np.ceil(self.pos[:n].max(axis=0)) + pad + 1
+        return (int(x1), int(y1), int(x2), int(y2))
+
+    def _stamp(self, radius, hollow):
+        # Pixel offsets of a filled disc, or a 2px ring for hollow particles
+        key = (radius, hollow)
+        if key not in self._stamps:
+            r = radius + 1
+            dy, dx = np.mgrid[-r:r + 1, -r:r + 1]
+            d = np.sqrt(dx * dx + dy * dy)
+            keep = (np.abs(d - radius) <= 1.0) if hollow else (d <= radius + 0.5)
+            self._stamps[key] = (dy[keep].astype(np.int32), dx[keep].astype(np.int32))
+        return self._stamps[key]
+
+    def render(self, img):
+        n = self.count
+        if n == 0:
+            return
+        h, w = img.shape[:2]
+        radii = self.radii()
+        visible = radii > 0
+        px = np.rint(self.pos[:n, 0]).astype(np.int32)
+        py = np.rint(self.pos[:n, 1]).astype(np.int32)
+        groups = radii * 2 + self.hollow[:n]
+
+        # One scatter per (radius, hollow) group instead of one call per particle
+        for key in np.unique(groups[visible]):
+            idx = np.flatnonzero(groups == key)
+            dy, dx = self._stamp(int(key) // 2, bool(key % 2))
+            ys = (py[idx, None] + dy[None, :]).ravel()
+            xs = (px[idx, None] + dx[None, :]).ravel()
+            colors = np.repeat(self.color[idx], len(dy), axis=0)
+            inside = (ys >= 0) & (ys < h) & (xs >= 0) & (xs < w)
+            img[ys[inside], xs[inside]] = colors[inside]
+
+class Emitter:
+    # Per-reaction particle source; accumulates fractional emission across frames
+    def __init__(self, preset, position):
+        self.preset = preset
+        self.position = position
+        self.carry = 0.0
+
+    def emit(self, system, dt, progress):
+        preset = self.preset
+        intensity = max(0.0, 1.0 - progress) if preset.get('fade') else 1.0
+        self.carry += preset['rate'] * intensity * dt
+        n = int(self.carry)
+        self.carry -= n
+        if n == 0:
+            return 0
+
+        x, y = self.position
+        origin = (x, y - progress * preset.get('rise', 0))
+        spread = preset['spawn_x']
+        if preset.get('narrow'):
+            # Column narrows as it grows, like the original foam
+            half = max(5, 40 - int(progress * preset.get('rise', 0)) // 3) // 2
+            spread = (-half, half)
+        return system.spawn(n, origin, preset, size_scale=max(intensity, 0.35), spread=spread)
@@ -0,0 +1,129 @@
+import threading
+import time
+
+import cv2
+
+from profiler import FrameProfiler
+
+# Pipelined native runner: camera capture, frame processing (inference + UI)
+# and display run on their own threads, connected by single-slot buffers where
+# the latest frame wins. A slow stage drops frames instead of building a queue.
+
+class LatestSlot:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.item = None
+        self.seq = 0
+        self.taken_seq = 0
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, item):
+        with self.cond:
+            if self.seq > self.taken_seq:
+                self.dropped += 1
+            self.item = item
+            self.seq += 1
+            self.cond.notify_all()
+
+    def get(self, timeout=None):
+        # Waits for an item newer than the last one taken; None on close/timeout
+        with self.cond:
+            self.cond.wait_for(lambda: self.seq > self.taken_seq or self.closed, timeout=timeout)
+            if self.seq <= self.taken_seq:
+                return None
+            self.taken_seq = self.seq
+            return self.item
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+class PipelinedRunner:
+    def __init__(self, painter, cap, window_name):
+        self.painter = painter
+        # Processed frames wait in a slot for the display thread, so each
+        # one needs its own buffer
+        painter.reuse_buffers = False
+        self.cap = cap
+        self.window_name = window_name
+        self.captured = LatestSlot()
+        self.processed = LatestSlot()
+        self.timer = FrameProfiler()
+        # Serializes painter state between the processing stage and key handling
+        self.painter_lock = threading.Lock()
+        self.running = False
+
+    def _capture_loop(self):
+        while self.running:
+            start = time.perf_counter()
+            success, frame = self.cap.read()
+            if not success:
+                print("Cannot read camera. Exiting.")
+                self.running = False
+                break
+            captured_at = time.perf_counter()
+            self.timer.record("capture", captured_at - start)
+            self.captured.put((frame, captured_at))
+        self.captured.close()
+
+    def _process_loop(self):
+        while self.running:
+            item = self.captured.get(timeout=0.5)
+            if item is None:
+                if self.captured.closed:
+                    break
+                continue
+            frame, captured_at = item
+            start = time.perf_counter()
+            with self.painter_lock:
+                processed = self.painter.process_frame(frame)
+            self.timer.record("process", time.perf_counter() - start)
+            self.processed.put((processed, captured_at))
+        self.processed.close()
+
+    def run(self):
+        self.running = True
+        threads = [
+            threading.Thread(target=self._capture_loop, name="capture", daemon=True),
+            threading.Thread(target=self._process_loop, name="process", daemon=True),
+        ]
+        for t in threads:
+            t.start()
+
+        # Display stays on the main thread, as HighGUI requires on some platforms
+        try:
+            while self.running:
+                item = self.processed.get(timeout=0.5)
+                if item is not None:
+                    frame, captured_at = item
+                    start = time.perf_counter()
+                    cv2.imshow(self.window_name, frame)
+                    shown_at = time.perf_counter()
+                    self.timer.record("display", shown_at - start)
+                    self.timer.record("latency", shown_at - captured_at)
+                elif self.processed.closed:
+                    break
+
+                key = cv2.waitKey(1) & 0xFF
+                with self.painter_lock:
+                    if not self.painter.handle_key(key):
+                        break
+        finally:
+            self.running = False
+            for t in threads:
+                t.join(timeout=2.0)
+
+    def stage_stats(self):
+        stats = self.timer.summary()
+        stats["dropped"] = {"captured": self.captured.dropped, "processed": self.processed.dropped}
+        return stats
+
+    def print_stage_stats(self):
+        stats = self.stage_stats()
+        dropped = stats.pop("dropped")
+        for stage, s in stats.items():
+            print(f"[FunDraw_ChemLab] {stage:>8}: {s['count']:>6} frames, p50 {s['p50_ms']:.1f} ms, "
+                  f"p95 {s['p95_ms']:.1f} ms, p99 {s['p99_ms']:.1f} ms")
+        print(f"[FunDraw_ChemLab] dropped: {dropped['captured']} captured, {dropped['processed']} processed")
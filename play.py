@@ -1,77 +1,86 @@
 import cv2
-import mediapipe as mp
 import numpy as np
 import time
 import os
-import random
 import math
+import argparse
 from datetime import datetime
 
-class ChemicalReaction:
-    def __init__(self, reactants, products, animation_type, color_change=None, text="", duration=3.0):
-        self.reactants = set(reactants)
-        self.products = products
-        self.animation_type = animation_type  # 'fire', 'fizz', 'color_change', 'smoke', 'foam'
-        self.color_change = color_change
-        self.text = text
-        self.duration = duration
+import strokes
+from particles import ParticleSystem, Emitter, EMITTER_PRESETS
+from effects import EffectsLayer
+from overlay import Overlay, ToolbarLayerCache, draw_rounded_rect
+from catalog import load_catalog
+from lab import Beaker, EducationalPanel
+from layout import UILayout
+from saver import AsyncImageSaver
+from history import CanvasHistory
+from commands import CommandBus
+from quality import QualityController
+from pipeline import PipelinedRunner
+from profiler import FrameProfiler
+from inference import (LocalHandTracker, MotionDetector, InferencePreprocessor, TRACKED_LANDMARKS,
+                       create_predictor, draw_hand_landmarks, hand_confidence, STALE)
+
+WINDOW_NAME = "FunDraw_ChemLab - AI Virtual Painter & Chemistry Lab"
+
+def union_bbox(a, b):
+    # Boxes are (x1, y1, x2, y2) with exclusive ends; None means empty
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
 
 class ChemistryEngine:
-    def __init__(self):
-        self.reactions = {
-            frozenset(['Sodium', 'Water']): ChemicalReaction(
-                ['Sodium', 'Water'], 'Hydrogen Gas + Heat',
-                'fire', None,
-                "Sodium reacts vigorously with water to produce hydrogen gas, which catches fire!", 4.0
-            ),
-            frozenset(['Acid', 'Base']): ChemicalReaction(
-                ['Acid', 'Base'], 'Water + Salt',
-                'color_change', (128, 255, 128),
-                "Acid neutralizes base producing water and salt. Heat is released!", 3.5
-            ),
-            frozenset(['Ethanol', 'Heat']): ChemicalReaction(
-                ['Ethanol', 'Heat'], 'Blue Flame',
-                'blue_fire', (255, 128, 0),
-                "Ethanol burns with a clean blue flame, producing CO2 and water!", 3.0
-            ),
-            frozenset(['Sugar', 'Acid']): ChemicalReaction(
-                ['Sugar', 'Acid'], 'Carbon Column',
-                'foam', (20, 20, 20),
-                "Sulfuric acid dehydrates sugar, creating a growing carbon column!", 5.0
-            ),
-            frozenset(['Copper_Sulfate', 'Ammonia']): ChemicalReaction(
-                ['Copper_Sulfate', 'Ammonia'], 'Deep Blue Complex',
-                'color_change', (200, 100, 0),
-                "Copper sulfate forms a beautiful deep blue complex with ammonia!", 3.0
-            ),
-            frozenset(['Magnesium', 'Heat']): ChemicalReaction(
-                ['Magnesium', 'Heat'], 'Bright White Light',
-                'bright_flash', (255, 255, 255),
-                "Magnesium burns with an intense white light - don't look directly!", 2.5
-            ),
-        }
-        
+    def __init__(self, catalog=None):
+        # Chemicals and reactions come from data files (JSON or CSV, see catalog.py)
+        self.catalog = catalog or load_catalog()
+        self.index = self.catalog.index
+        print(f"[FunDraw_ChemLab] Loaded {len(self.catalog.palette)} chemicals and {len(self.index)} reactions")
+
         self.active_reactions = []
-        self.particles = []
+        self.particles = ParticleSystem()
+        self.effects = EffectsLayer()
+        self.last_update = None
+
+    @property
+    def reactions(self):
+        return self.index.reactions
+
+    def find_reactions(self, chemicals_in_beaker):
+        # Every applicable reaction, highest priority first
+        return self.index.find(chemicals_in_beaker)
 
     def check_reaction(self, chemicals_in_beaker):
-        chemical_set = frozenset(chemicals_in_beaker)
-        for reaction_key, reaction in self.reactions.items():
-            if reaction_key.issubset(chemical_set):
-                return reaction
-        return None
+        return self.index.first(chemicals_in_beaker)
+
+    def check_mask(self, mask):
+        # Same as check_reaction for beaker contents given as an ID bitmask
+        return self.index.first_mask(mask)
 
     def start_reaction(self, reaction, position):
+        preset = EMITTER_PRESETS.get(reaction.animation_type)
         self.active_reactions.append({
             'reaction': reaction,
             'position': position,
             'start_time': time.time(),
-            'particles': []
+            'emitter': Emitter(preset, position) if preset else None
         })
 
-    def update_reactions(self, canvas):
+    def reset(self):
+        self.active_reactions = []
+        self.particles.clear()
+
+    def update_reactions(self, frame):
+        # Draws this frame's effects over the output frame, never into the
+        # canvas. Returns the bounding box of everything drawn (or None)
         current_time = time.time()
+        dt = 0.0 if self.last_update is None else min(current_time - self.last_update, 0.1)
+        self.last_update = current_time
         active_reactions_copy = self.active_reactions.copy()
+        effects = self.effects
+        effects.begin(frame)
         
         for reaction_data in active_reactions_copy:
             elapsed = current_time - reaction_data['start_time']
@@ -79,127 +88,116 @@ class ChemistryEngine:
                 self.active_reactions.remove(reaction_data)
                 continue
                 
-            self.render_reaction(canvas, reaction_data, elapsed)
+            self.render_reaction(effects, reaction_data, elapsed, dt)
 
-    def render_reaction(self, canvas, reaction_data, elapsed):
+        # Particles outlive their emitters until their own life runs out
+        self.particles.update(dt)
+        effects.draw_particles(self.particles)
+        return effects.end()
+
+    def render_reaction(self, effects, reaction_data, elapsed, dt):
         reaction = reaction_data['reaction']
         pos = reaction_data['position']
         progress = elapsed / reaction.duration
         
-        if reaction.animation_type == 'fire':
-            self.render_fire_animation(canvas, pos, progress)
-        elif reaction.animation_type == 'blue_fire':
-            self.render_blue_fire_animation(canvas, pos, progress)
-        elif reaction.animation_type == 'fizz':
-            self.render_fizz_animation(canvas, pos, progress)
+        if reaction_data['emitter'] is not None:
+            reaction_data['emitter'].emit(self.particles, dt, progress)
         elif reaction.animation_type == 'color_change':
-            self.render_color_change(canvas, pos, reaction.color_change, progress)
-        elif reaction.animation_type == 'foam':
-            self.render_foam_animation(canvas, pos, progress)
+            self.render_color_change(effects, pos, reaction.color_change, progress)
         elif reaction.animation_type == 'bright_flash':
-            self.render_bright_flash(canvas, pos, progress)
-        elif reaction.animation_type == 'smoke':
-            self.render_smoke_animation(canvas, pos, progress)
+            self.render_bright_flash(effects, pos, progress)
 
-    def render_fire_animation(self, canvas, pos, progress):
-        x, y = pos
-        intensity = max(0, 1 - progress)
-        
-        # Multiple flame particles
-        for i in range(8):
-            flame_x = x + random.randint(-30, 30)
-            flame_y = y - random.randint(10, 60) - int(progress * 40)
-            size = random.randint(8, 20) * intensity
-            
-            if size > 2:
-                # Red-orange-yellow gradient
-                color = (random.randint(0, 100), random.randint(100, 200), random.randint(200, 255))
-                cv2.circle(canvas, (int(flame_x), int(flame_y)), int(size), color, -1)
-
-    def render_blue_fire_animation(self, canvas, pos, progress):
-        x, y = pos
-        intensity = max(0, 1 - progress)
-        
-        for i in range(6):
-            flame_x = x + random.randint(-20, 20)
-            flame_y = y - random.randint(5, 40) - int(progress * 30)
-            size = random.randint(6, 15) * intensity
-            
-            if size > 2:
-                # Blue flame colors
-                color = (random.randint(200, 255), random.randint(50, 150), random.randint(0, 100))
-                cv2.circle(canvas, (int(flame_x), int(flame_y)), int(size), color, -1)
-
-    def render_fizz_animation(self, canvas, pos, progress):
-        x, y = pos
-        
-        for i in range(15):
-            bubble_x = x + random.randint(-40, 40)
-            bubble_y = y - random.randint(0, 80) - int(progress * 50)
-            size = random.randint(2, 8)
-            
-            color = (random.randint(200, 255), random.randint(200, 255), random.randint(150, 255))
-            cv2.circle(canvas, (int(bubble_x), int(bubble_y)), size, color, 2)
-
-    def render_color_change(self, canvas, pos, color, progress):
-        x, y = pos
+    def render_color_change(self, effects, pos, color, progress):
         radius = int(30 + progress * 50)
         alpha = max(0.3, 1 - progress * 0.5)
-        
-        overlay = canvas.copy()
-        cv2.circle(overlay, (x, y), radius, color, -1)
-        cv2.addWeighted(canvas, 1 - alpha, overlay, alpha, 0, canvas)
+        effects.blend_circle(pos, radius, color, alpha)
 
-    def render_foam_animation(self, canvas, pos, progress):
-        x, y = pos
-        
-        # Growing foam column
-        foam_height = int(progress * 100)
-        for i in range(0, foam_height, 5):
-            foam_y = y - i
-            width = max(5, 40 - i // 3)
-            color = (random.randint(10, 50), random.randint(10, 50), random.randint(10, 50))
-            cv2.circle(canvas, (x + random.randint(-width//2, width//2), foam_y), 
-                      random.randint(3, 10), color, -1)
-
-    def render_bright_flash(self, canvas, pos, progress):
-        x, y = pos
+    def render_bright_flash(self, effects, pos, progress):
         if progress < 0.3:  # Flash only in first 30% of animation
             intensity = (0.3 - progress) / 0.3
             radius = int(60 * intensity)
-            overlay = canvas.copy()
-            cv2.circle(overlay, (x, y), radius, (255, 255, 255), -1)
-            cv2.addWeighted(canvas, 1 - intensity * 0.8, overlay, intensity * 0.8, 0, canvas)
-
-    def render_smoke_animation(self, canvas, pos, progress):
-        x, y = pos
-        
-        for i in range(10):
-            smoke_x = x + random.randint(-50, 50) + int(progress * random.randint(-30, 30))
-            smoke_y = y - random.randint(20, 100) - int(progress * 60)
-            size = random.randint(5, 20)
-            
-            color = (random.randint(100, 150), random.randint(100, 150), random.randint(100, 150))
-            cv2.circle(canvas, (int(smoke_x), int(smoke_y)), size, color, -1)
+            effects.blend_circle(pos, radius, (255, 255, 255), intensity * 0.8)
+
+class SelectionDwell:
+    # Non-blocking replacement for sleeping while the finger hovers the toolbar.
+    # A target is committed once the finger has rested on it for `dwell` seconds,
+    # and is not committed again until the finger moves to another target or
+    # leaves the toolbar, so a mode button cannot flip back and forth every frame.
+    def __init__(self, dwell=0.09):
+        self.dwell = dwell
+        self.candidate = None
+        self.since = 0.0
+        self.committed = False
+
+    def reset(self):
+        self.candidate = None
+        self.committed = False
+
+    def update(self, target, now):
+        # Returns True on the frame the target should be applied
+        if target != self.candidate:
+            self.candidate = target
+            self.since = now
+            self.committed = False
+        if target is None or self.committed:
+            return False
+        if now - self.since >= self.dwell:
+            self.committed = True
+            return True
+        return False
 
 class RamperVirtualPainter:
-    def __init__(self, cam_index=None, width=1280, height=720, command_queue=None):
+    def __init__(self, cam_index=None, width=1280, height=720, command_queue=None, hand_tracker=None,
+                 inference_interval=1, motion_threshold=None, landmark_predictor="velocity",
+                 inference_width=None, roi_crop=False, reaction_catalog=None, chemical_catalog=None,
+                 save_format="png", save_level=None, reuse_buffers=True, reply_queue=None,
+                 quality=None):
         # Video capture is handled externally in web mode, or via run() in local mode
         self.cam_index = cam_index
         self.command_queue = command_queue
+        # UI commands are drained and coalesced once per frame; acks go back on reply_queue
+        self.commands = CommandBus(command_queue, reply_queue)
         self.width = width
         self.height = height
 
-        self.mp_hands = mp.solutions.hands
-        self.hands = self.mp_hands.Hands(
-            static_image_mode=False,
-            max_num_hands=1,
-            min_detection_confidence=0.75,
-            min_tracking_confidence=0.7
-        )
-        self.mp_draw = mp.solutions.drawing_utils
+        # Hand landmarks come from a pluggable backend; by default each painter
+        # owns its own MediaPipe graph (see inference.py for the shared pool),
+        # loaded in the background so the first frames are not held up
+        self.hands = hand_tracker if hand_tracker is not None else LocalHandTracker(background=True)
+
+        # Landmark inference scheduling: run the model every inference_interval
+        # frames, or sooner when the motion score exceeds motion_threshold; in
+        # between, the thumb/index tips are extrapolated by the predictor
+        self.inference_interval = inference_interval
+        self.motion_threshold = motion_threshold
+        self.landmark_predictor = create_predictor(landmark_predictor)
+        self.motion_detector = MotionDetector()
+        self.frames_since_inference = 0
+        self.last_hand = None
+
+        # Model input: optional downscale to inference_width and ROI crop
+        self.preprocessor = InferencePreprocessor(
+            inference_width=inference_width, roi_crop=roi_crop,
+            reuse_buffers=not getattr(self.hands, "retains_input", False))
+        # The flipped frame is written into one buffer kept across frames, so
+        # the frame process_frame returns is only valid until the next call.
+        # Callers that hold on to output frames (the pipelined runner) turn
+        # this off.
+        self.reuse_buffers = reuse_buffers
+        self.frame_buffer = None
+
+        # Optional QualityController: lowers the settings below when frames
+        # take too long; the constructor values are the best it will go back
+        # up to
+        self.quality = quality
 
         self.canvas = None
+        # Ink bookkeeping: ink_mask marks canvas pixels that replace the video,
+        # ink_bbox bounds everything drawn since the last clear and dirty_bbox
+        # bounds what changed since the mask was last refreshed
+        self.ink_mask = None
+        self.ink_bbox = None
+        self.dirty_bbox = None
         self.prev_x, self.prev_y = None, None
         self.smoothed_x, self.smoothed_y = 0, 0
         self.smoothing_factor = 0.25
@@ -236,34 +234,25 @@ class RamperVirtualPainter:
         ]
         
         # Chemistry mode chemicals
-        self.chemicals = [
-            "Sodium", "Water", "Acid", "Base", "Ethanol", "Sugar", "Copper_Sulfate", 
-            "Ammonia", "Heat", "Magnesium"
-        ]
-        self.chemical_colors = [
-            (192, 192, 192),  # Sodium - Silver
-            (255, 255, 200),  # Water - Light Blue
-            (0, 100, 255),    # Acid - Red
-            (255, 100, 0),    # Base - Blue  
-            (200, 255, 200),  # Ethanol - Light Green
-            (255, 255, 255),  # Sugar - White
-            (200, 100, 0),    # Copper Sulfate - Blue
-            (100, 200, 100),  # Ammonia - Light Green
-            (0, 140, 255),    # Heat - Orange
-            (220, 220, 220),  # Magnesium - Light Gray
-        ]
+        # Chemicals shown in the toolbar come from the compiled catalog
+        self.chemistry_engine = ChemistryEngine(load_catalog(chemical_catalog, reaction_catalog))
+        self.base_quality = {"inference_width": inference_width, "inference_interval": inference_interval,
+                             "particle_budget": self.chemistry_engine.particles.budget}
+        self.catalog = self.chemistry_engine.catalog
+        self.chemicals = self.catalog.palette
+        self.chemical_colors = [self.catalog.color(chem) for chem in self.chemicals]
         
         self.selected_color_idx = 0
         self.selected_color = self.color_list[self.selected_color_idx]
         self.selected_chemical = self.chemicals[0]
 
         # Chemistry lab components
-        self.chemistry_engine = ChemistryEngine()
-        self.beakers = [
-            {"pos": (300, 350), "radius": 60, "chemicals": [], "color": (100, 100, 100)},
-            {"pos": (600, 350), "radius": 60, "chemicals": [], "color": (100, 100, 100)},
-            {"pos": (900, 350), "radius": 60, "chemicals": [], "color": (100, 100, 100)},
-        ]
+        self.beakers = [Beaker("Beaker 1", (300, 350)), Beaker("Beaker 2", (600, 350)),
+                        Beaker("Beaker 3", (900, 350))]
+        self.lab_size = None
+        # Toolbar and lab geometry for the current frame size (see layout.py)
+        self.layout = None
+        self.educational_panel = EducationalPanel()
         self.dragging_chemical = None
         self.educational_text = ""
         self.educational_text_time = 0
@@ -272,9 +261,29 @@ class RamperVirtualPainter:
         self.mode = "IDLE"  # IDLE / DRAW / SELECT
         self.last_mode_change = time.time()
         self.mode_debounce = 0.12
+        self.selection_dwell = SelectionDwell(dwell=0.09)
 
         self.save_dir = "saved_paintings"
         os.makedirs(self.save_dir, exist_ok=True)
+        # Encoding and disk writes happen off the frame path
+        self.saver = AsyncImageSaver(fmt=save_format, level=save_level, on_complete=self.on_saved)
+        self.save_notice = None
+        # Vector record of the canvas strokes, saved with the svg/strokes formats
+        self.stroke_log = strokes.StrokeLog()
+        # Tile-granular undo/redo; one entry per stroke or clear
+        self.history = CanvasHistory()
+        # The three-finger undo pose has to be held, so passing through it
+        # between other poses does not undo
+        self.undo_dwell = SelectionDwell(dwell=0.35)
+
+        # Toolbars only change with mode, selection or frame size
+        self.toolbar_cache = ToolbarLayerCache()
+        self.overlay = Overlay()
+
+        # Per-stage frame timing ('p' toggles the overlay, 't' dumps a trace)
+        self.profiler = FrameProfiler()
+        self.show_profiler = False
+        self.trace_dir = "traces"
 
     def fingers_up(self, landmarks, w, h):
         pts = [(int(lm.x * w), int(lm.y * h)) for lm in landmarks]
@@ -302,89 +311,43 @@ class RamperVirtualPainter:
         return fingers, pts
 
     def draw_rounded_rect(self, img, pt1, pt2, color, thickness=1, radius=10, filled=False):
-        x1, y1 = pt1
-        x2, y2 = pt2
-        
-        # Clamp radius
-        w = x2 - x1
-        h = y2 - y1
-        radius = min(radius, w//2, h//2)
-        
-        # Corners
-        corners = [
-            ((x1 + radius, y1 + radius), 180, 270), # Top-left
-            ((x2 - radius, y1 + radius), 270, 360), # Top-right
-            ((x2 - radius, y2 - radius), 0, 90),    # Bottom-right
-            ((x1 + radius, y2 - radius), 90, 180)   # Bottom-left
-        ]
-        
-        if filled:
-            # Draw filled rectangle with rounded corners hack
-            # Center rect
-            cv2.rectangle(img, (x1 + radius, y1), (x2 - radius, y2), color, -1)
-            # Side rects
-            cv2.rectangle(img, (x1, y1 + radius), (x1 + radius, y2 - radius), color, -1)
-            cv2.rectangle(img, (x2 - radius, y1 + radius), (x2, y2 - radius), color, -1)
-            # Corner circles
-            cv2.circle(img, (x1 + radius, y1 + radius), radius, color, -1)
-            cv2.circle(img, (x2 - radius, y1 + radius), radius, color, -1)
-            cv2.circle(img, (x2 - radius, y2 - radius), radius, color, -1)
-            cv2.circle(img, (x1 + radius, y2 - radius), radius, color, -1)
-        else:
-            # Draw outline
-            # Lines
-            cv2.line(img, (x1 + radius, y1), (x2 - radius, y1), color, thickness)
-            cv2.line(img, (x1 + radius, y2), (x2 - radius, y2), color, thickness)
-            cv2.line(img, (x1, y1 + radius), (x1, y2 - radius), color, thickness)
-            cv2.line(img, (x2, y1 + radius), (x2, y2 - radius), color, thickness)
-            # Arcs
-            for center, start_angle, end_angle in corners:
-                cv2.ellipse(img, center, (radius, radius), 0, start_angle, end_angle, color, thickness)
+        draw_rounded_rect(img, pt1, pt2, color, thickness, radius, filled)
 
     def draw_painter_toolbar(self, frame):
         h, w, _ = frame.shape
+        key = ("PAINTER", self.selected_color_idx, w, h)
+        self.toolbar_cache.composite(frame, key, self.render_painter_toolbar, self.ui_layout(w, h).toolbar_rows)
+
+    def draw_chemistry_toolbar(self, frame):
+        h, w, _ = frame.shape
+        key = ("CHEMISTRY", self.selected_chemical, w, h)
+        self.toolbar_cache.composite(frame, key, self.render_chemistry_toolbar, self.ui_layout(w, h).toolbar_rows)
+
+    def render_painter_toolbar(self, frame):
+        h, w, _ = frame.shape
         
+        layout = self.ui_layout(w, h)
+
         # Modern Dark Glassmorphism Header
-        header_height = self.toolbar_height + 25
-        header_bg = frame[0:header_height, 0:w].copy()
-        rect = np.full(header_bg.shape, (20, 20, 20), dtype=np.uint8)
-        frame[0:header_height, 0:w] = cv2.addWeighted(header_bg, 0.3, rect, 0.7, 0)
+        header_height = layout.header_height
+        self.overlay.fill_rect(frame, (0, 0), (w, header_height), (20, 20, 20), 0.7)
         
         # Bottom border for header
         cv2.line(frame, (0, header_height), (w, header_height), (100, 100, 100), 1)
 
         # Mode Selection Pill (Top Right)
-        mode_btn_w = 160
-        mode_btn_h = 40
-        mode_btn_x = w - mode_btn_w - 20
-        mode_btn_y = 20
+        mode_btn_x, mode_btn_y, mode_btn_x2, mode_btn_y2 = layout.mode_button
         
         # Draw Mode Button (Outline style)
-        self.draw_rounded_rect(frame, (mode_btn_x, mode_btn_y), 
-                             (mode_btn_x + mode_btn_w, mode_btn_y + mode_btn_h),
+        self.draw_rounded_rect(frame, (mode_btn_x, mode_btn_y), (mode_btn_x2, mode_btn_y2),
                              (0, 200, 255), thickness=1, radius=20, filled=False)
         
         cv2.putText(frame, "SWITCH MODE", (mode_btn_x + 25, mode_btn_y + 26),
                     cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 200, 255), 1, cv2.LINE_AA)
 
         # Color/Tool Cards
-        available_width = w - mode_btn_w - 60
-        slots = len(self.color_list)
-        
-        # Calculate optimal card size based on available width
-        card_spacing = 15
-        card_width = int((available_width - (slots + 1) * card_spacing) / slots)
-        card_width = min(card_width, 100) # Max width constraint
-        card_height = 80
-        
-        start_x = 20
-        start_y = 15
-        
         for i, col in enumerate(self.color_list):
-            x1 = start_x + i * (card_width + card_spacing)
-            y1 = start_y
-            x2 = x1 + card_width
-            y2 = y1 + card_height
+            x1, y1, x2, y2 = layout.cards["PAINTER"][i]
             
             # Is selected?
             is_selected = (i == self.selected_color_idx)
@@ -429,48 +392,30 @@ class RamperVirtualPainter:
 
         # Instructions Pill at the bottom center of video (Floating)
         instr_text = "👆 Point to Draw  |  ✌️ Select Color  |  ✋ Clear (C)"
-        self.draw_floating_pill(frame, instr_text, w, h - 50)
+        self.draw_floating_pill(frame, instr_text, w, layout.pill_y)
 
-    def draw_chemistry_toolbar(self, frame):
+    def render_chemistry_toolbar(self, frame):
         h, w, _ = frame.shape
         
+        layout = self.ui_layout(w, h)
+
         # Modern Dark Glassmorphism Header
-        header_height = self.toolbar_height + 25
-        header_bg = frame[0:header_height, 0:w].copy()
-        rect = np.full(header_bg.shape, (20, 30, 25), dtype=np.uint8) # Slightly greenish tint for chemistry
-        frame[0:header_height, 0:w] = cv2.addWeighted(header_bg, 0.3, rect, 0.7, 0)
+        header_height = layout.header_height
+        self.overlay.fill_rect(frame, (0, 0), (w, header_height), (20, 30, 25), 0.7) # Slightly greenish tint for chemistry
         cv2.line(frame, (0, header_height), (w, header_height), (100, 150, 100), 1)
 
         # Mode Selection Pill (Top Right)
-        mode_btn_w = 160
-        mode_btn_h = 40
-        mode_btn_x = w - mode_btn_w - 20
-        mode_btn_y = 20
+        mode_btn_x, mode_btn_y, mode_btn_x2, mode_btn_y2 = layout.mode_button
         
-        self.draw_rounded_rect(frame, (mode_btn_x, mode_btn_y), 
-                             (mode_btn_x + mode_btn_w, mode_btn_y + mode_btn_h),
+        self.draw_rounded_rect(frame, (mode_btn_x, mode_btn_y), (mode_btn_x2, mode_btn_y2),
                              (0, 255, 100), thickness=1, radius=20, filled=False)
         
         cv2.putText(frame, "SWITCH MODE", (mode_btn_x + 25, mode_btn_y + 26),
                     cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 100), 1, cv2.LINE_AA)
 
         # Chemical Cards
-        available_width = w - mode_btn_w - 60
-        slots = len(self.chemicals)
-        
-        card_spacing = 10
-        card_width = int((available_width - (slots + 1) * card_spacing) / slots)
-        card_width = min(card_width, 110)
-        card_height = 80
-        
-        start_x = 20
-        start_y = 15
-        
         for i, chem in enumerate(self.chemicals):
-            x1 = start_x + i * (card_width + card_spacing)
-            y1 = start_y
-            x2 = x1 + card_width
-            y2 = y1 + card_height
+            x1, y1, x2, y2 = layout.cards["CHEMISTRY"][i]
             
             is_selected = (chem == self.selected_chemical)
             
@@ -508,228 +453,154 @@ class RamperVirtualPainter:
 
         # Instructions Pill
         instr_text = "✌️ Select Chemical  |  🤏 Drag to Beaker  |  🧪 Mix"
-        self.draw_floating_pill(frame, instr_text, w, h - 50)
+        self.draw_floating_pill(frame, instr_text, w, layout.pill_y)
 
     def draw_floating_pill(self, frame, text, w, y_pos):
-        # Draw a floating pill with instructions
-        text_size = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 1)[0]
-        pill_w = text_size[0] + 40
-        pill_h = 40
-        pill_x = (w - pill_w) // 2
-        
-        # Transparent background
-        overlay = frame.copy()
-        self.draw_rounded_rect(overlay, (pill_x, y_pos), (pill_x + pill_w, y_pos + pill_h), (0, 0, 0), radius=20, filled=True)
-        cv2.addWeighted(overlay, 0.6, frame, 0.4, 0, frame)
-        
-        cv2.putText(frame, text, (pill_x + 20, y_pos + 28),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1, cv2.LINE_AA)
+        # Draw a floating pill with instructions (cached sprite per text)
+        self.overlay.pill(frame, text, w // 2, y_pos)
 
     def draw_chemistry_lab(self, frame):
         h, w, _ = frame.shape
         
-        # Position beakers better for full screen utilization
-        lab_start_y = self.toolbar_height + self.instruction_height
-        lab_height = h - lab_start_y - 150  # Reserve space for educational text
-        
-        # Update beaker positions for better spacing
-        beaker_y = lab_start_y + lab_height // 2
-        spacing = (w - 200) // (len(self.beakers) + 1)
+        # Beaker positions only change with the frame size
+        if self.lab_size != (w, h):
+            self.layout_beakers(w, h)
         
-        for i, beaker in enumerate(self.beakers):
-            beaker["pos"] = (100 + spacing * (i + 1), beaker_y)
-        
-        # Draw beakers
-        for i, beaker in enumerate(self.beakers):
-            pos = beaker["pos"]
-            radius = beaker["radius"]
-            
-            # Beaker outline with better styling
-            cv2.circle(frame, pos, radius, (180, 180, 180), 3)
-            cv2.circle(frame, pos, radius - 5, (120, 120, 120), 2)
-            
-            # Beaker base
-            base_rect = (pos[0] - radius + 10, pos[1] + radius - 15, 
-                        pos[0] + radius - 10, pos[1] + radius + 5)
-            cv2.rectangle(frame, (base_rect[0], base_rect[1]), (base_rect[2], base_rect[3]), 
-                         (150, 150, 150), 2)
-            
-            # Beaker contents (mixed chemical colors)
-            if beaker["chemicals"]:
-                mixed_color = self.mix_chemical_colors(beaker["chemicals"])
-                cv2.circle(frame, (pos[0], pos[1] + 12), radius - 12, mixed_color, -1)
-                
-                # Chemical names in beaker - better formatting
-                y_offset = pos[1] - radius - 15
-                for j, chem in enumerate(beaker["chemicals"]):
-                    cv2.putText(frame, chem[:10], (pos[0] - 40, y_offset - j * 18),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1, cv2.LINE_AA)
-            
-            # Beaker label with better styling
-            cv2.putText(frame, f"Beaker {i+1}", (pos[0] - 40, pos[1] + radius + 30),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.55, (220, 220, 220), 2, cv2.LINE_AA)
+        # Draw beakers from their cached sprites
+        for beaker in self.beakers:
+            beaker.draw(frame)
 
         # Draw educational text with improved layout
         if self.educational_text and time.time() - self.educational_text_time < 6:
-            text_y = h - 140
-            
-            # Background for text with better opacity
-            cv2.rectangle(frame, (15, text_y - 45), (w - 15, h - 15), (30, 30, 30), -1)
-            cv2.rectangle(frame, (15, text_y - 45), (w - 15, h - 15), (100, 255, 100), 2)
-            
-            # Wrap long text more efficiently
-            max_chars_per_line = min(90, w // 10)  # Adaptive line length based on screen width
-            words = self.educational_text.split()
-            lines = []
-            current_line = ""
-            
-            for word in words:
-                if len(current_line + word) < max_chars_per_line:
-                    current_line += word + " "
-                else:
-                    lines.append(current_line.strip())
-                    current_line = word + " "
-            if current_line:
-                lines.append(current_line.strip())
-            
-            # Draw educational text lines
-            for i, line in enumerate(lines[:3]):  # Max 3 lines
-                cv2.putText(frame, line, (25, text_y - 25 + i * 22),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (120, 255, 120), 1, cv2.LINE_AA)
-
-    def mix_chemical_colors(self, chemicals):
-        if not chemicals:
-            return (100, 100, 100)
-        
-        total_r, total_g, total_b = 0, 0, 0
-        for chemical in chemicals:
-            if chemical in self.chemicals:
-                idx = self.chemicals.index(chemical)
-                color = self.chemical_colors[idx]
-                total_r += color[0]
-                total_g += color[1] 
-                total_b += color[2]
-        
-        count = len(chemicals)
-        return (total_r // count, total_g // count, total_b // count)
-
-    def select_from_painter_toolbar(self, x, y, frame_w):
-        if y > self.toolbar_height:
-            return False
-            
-        # Check mode switch button - updated coordinates
-        mode_button_width = 140
-        mode_btn_x = frame_w - mode_button_width - 10
-        if x >= mode_btn_x and x <= frame_w - 10:
-            self.app_mode = "CHEMISTRY"
-            self.canvas = np.zeros_like(self.canvas) if self.canvas is not None else None
-            return True
-            
-        # Check color slots
-        available_width = frame_w - mode_button_width - 30
-        slots = len(self.color_list)
-        padding = 12
-        total_padding = padding * (slots + 1)
-        slot_width = max(65, (available_width - total_padding) // slots)
-
-        for i in range(slots):
-            x1 = padding + i * (slot_width + padding)
-            x2 = x1 + slot_width
-            if x1 <= x <= x2:
-                self.selected_color_idx = i
-                self.selected_color = self.color_list[i]
-                self.is_eraser = (i == slots - 1)
-                return True
-        return False
-
-    def select_from_chemistry_toolbar(self, x, y, frame_w):
-        if y > self.toolbar_height:
-            return False
-            
-        # Check mode switch button - updated coordinates
-        mode_button_width = 120
-        mode_btn_x = frame_w - mode_button_width - 10
-        if x >= mode_btn_x and x <= frame_w - 10:
-            self.app_mode = "PAINTER"
-            self.canvas = np.zeros_like(self.canvas) if self.canvas is not None else None
-            return True
-            
-        # Check chemical slots
-        available_width = frame_w - mode_button_width - 30
-        slots = len(self.chemicals)
-        padding = 8
-        total_padding = padding * (slots + 1)
-        slot_width = max(60, (available_width - total_padding) // slots)
-
-        for i in range(slots):
-            x1 = padding + i * (slot_width + padding)
-            x2 = x1 + slot_width
-            if x1 <= x <= x2:
-                self.selected_chemical = self.chemicals[i]
-                return True
-        return False
+            self.educational_panel.draw(frame, self.educational_text)
+
+    def ui_layout(self, w, h):
+        # Rebuilt only when the frame size or the number of slots changes
+        slot_counts = {"PAINTER": len(self.color_list), "CHEMISTRY": len(self.chemicals)}
+        if self.layout is None or not self.layout.matches(w, h, slot_counts):
+            self.layout = UILayout(w, h, self.toolbar_height, self.instruction_height, slot_counts,
+                                   [beaker.radius for beaker in self.beakers])
+        return self.layout
+
+    def layout_beakers(self, w, h):
+        for beaker, pos in zip(self.beakers, self.ui_layout(w, h).beakers):
+            beaker.move(pos)
+        self.lab_size = (w, h)
+
+    def in_toolbar(self, y):
+        return self.layout is not None and y < self.layout.header_height
+
+    def painter_toolbar_target(self, x, y):
+        # Returns ("mode", None), ("color", idx) or None
+        if self.layout is None:
+            return None
+        return self.layout.toolbar_target("PAINTER", x, y)
+
+    def apply_painter_selection(self, target):
+        kind, idx = target
+        if kind == "mode":
+            self.switch_mode("CHEMISTRY")
+        else:
+            self.selected_color_idx = idx
+            self.selected_color = self.color_list[idx]
+            self.is_eraser = (idx == len(self.color_list) - 1)
+
+    def chemistry_toolbar_target(self, x, y):
+        # Returns ("mode", None), ("chemical", idx) or None
+        if self.layout is None:
+            return None
+        return self.layout.toolbar_target("CHEMISTRY", x, y)
+
+    def apply_chemistry_selection(self, target):
+        kind, idx = target
+        if kind == "mode":
+            self.switch_mode("PAINTER")
+        else:
+            self.selected_chemical = self.chemicals[idx]
 
     def find_beaker_at_position(self, x, y):
-        for i, beaker in enumerate(self.beakers):
-            pos = beaker["pos"]
-            radius = beaker["radius"]
-            distance = math.sqrt((x - pos[0])**2 + (y - pos[1])**2)
-            if distance <= radius:
-                return i
-        return None
+        # Beakers only move with the layout, so its label map is current
+        if self.layout is None or self.lab_size != self.layout.size:
+            return None
+        return self.layout.beaker_at(x, y)
 
     def check_chemical_reactions(self, beaker_idx):
         beaker = self.beakers[beaker_idx]
-        if len(beaker["chemicals"]) >= 2:
-            reaction = self.chemistry_engine.check_reaction(beaker["chemicals"])
+        if len(beaker.chemicals) >= 2:
+            reaction = self.chemistry_engine.check_mask(beaker.mask)
             if reaction:
-                self.chemistry_engine.start_reaction(reaction, beaker["pos"])
+                self.chemistry_engine.start_reaction(reaction, beaker.pos)
                 self.educational_text = reaction.text
                 self.educational_text_time = time.time()
                 
                 # Clear beaker after reaction
-                beaker["chemicals"] = []
+                beaker.empty()
 
-    def save_canvas(self):
+    def save_canvas(self, fmt=None):
+        if self.canvas is None:
+            return None
         if self.app_mode == "PAINTER":
-            fname = datetime.now().strftime("FunDraw_painting_%Y%m%d_%H%M%S.png")
+            fname = datetime.now().strftime("FunDraw_painting_%Y%m%d_%H%M%S")
         else:
-            fname = datetime.now().strftime("FunDraw_chemistry_%Y%m%d_%H%M%S.png")
-        save_path = os.path.join(self.save_dir, fname)
-        cv2.imwrite(save_path, self.canvas)
-        print(f"[FunDraw_ChemLab] Saved {self.app_mode.lower()} to {save_path}")
+            fname = datetime.now().strftime("FunDraw_chemistry_%Y%m%d_%H%M%S")
+        stem = os.path.join(self.save_dir, fname)
+        if fmt in strokes.VECTOR_FORMATS:
+            # The stroke log is copied here and serialized on the writer thread
+            log = self.stroke_log.snapshot()
+            if fmt == "svg":
+                encode = lambda: log.to_svg().encode("utf-8")
+            else:
+                encode = log.to_bytes
+            save_path = self.saver.save_data(stem + strokes.VECTOR_FORMATS[fmt], encode)
+        else:
+            # Only the inked region needs copying; the rest of the canvas is black
+            save_path = self.saver.save(self.canvas, stem, fmt=fmt, bbox=self.ink_bbox or (0, 0, 0, 0))
+        if save_path is None:
+            self.save_notice = ("Save skipped: too many saves pending", time.time())
+            print("[FunDraw_ChemLab] Save skipped, writer queue is full")
+        return save_path
+
+    def on_saved(self, result):
+        # Called from the saver thread
+        self.save_notice = (result.message(), time.time())
+        self.commands.reply("save", result.ok, result.message())
+        if result.ok:
+            print(f"[FunDraw_ChemLab] Saved {self.app_mode.lower()} to {result.path}")
+        else:
+            print(f"[FunDraw_ChemLab] Could not save {result.path}: {result.error}")
+
+    def process_frame(self, frame, inference_rgb=None):
+        # inference_rgb: optional unflipped RGB copy of frame (any size) to use
+        # as the model input, e.g. converted and scaled by the video decoder,
+        # or a callable returning one; it is only called on frames that run
+        # inference without an ROI crop
+        start = time.perf_counter()
+        prof = self.profiler
+        prof.begin_frame()
 
-    def process_frame(self, frame):
         # Process external commands
-        if self.command_queue:
-            while not self.command_queue.empty():
-                try:
-                    cmd = self.command_queue.get_nowait()
-                    if cmd["type"] == "clear":
-                        self.canvas = np.zeros_like(self.canvas)
-                    elif cmd["type"] == "save":
-                        self.save_canvas()
-                    elif cmd["type"] == "mode":
-                        self.app_mode = cmd["value"]
-                        self.canvas = np.zeros_like(self.canvas)
-                    elif cmd["type"] == "brush_size":
-                         if cmd["action"] == "increase":
-                             self.brush_thickness = min(self.brush_thickness + 2, 60)
-                         else:
-                             self.brush_thickness = max(self.brush_thickness - 2, 2)
-                except:
-                    pass
+        batch = self.commands.drain()
+        if batch:
+            self.apply_commands(batch)
+        prof.lap("commands")
 
         # Flip frame horizontally for mirror effect
-        frame = cv2.flip(frame, 1)
+        if self.reuse_buffers:
+            if self.frame_buffer is None or self.frame_buffer.shape != frame.shape:
+                self.frame_buffer = np.empty_like(frame)
+            frame = cv2.flip(frame, 1, dst=self.frame_buffer)
+        else:
+            frame = cv2.flip(frame, 1)
         h, w, _ = frame.shape
         
         # Ensure canvas matches frame size
         if self.canvas is None or self.canvas.shape != frame.shape:
-             self.canvas = np.zeros_like(frame)
+             self.resize_canvas(frame.shape)
+        self.ui_layout(w, h)
+        prof.lap("flip")
 
-        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = self.hands.process(rgb)
+        hand = self.detect_hand(frame, w, h, inference_rgb)
+        prof.lap("tracking")
 
         # Draw appropriate toolbar
         if self.app_mode == "PAINTER":
@@ -737,13 +608,13 @@ class RamperVirtualPainter:
         else:
             self.draw_chemistry_toolbar(frame)
             self.draw_chemistry_lab(frame)
+        prof.lap("toolbar")
 
         current_time = time.time()
         detected_fingers = None
 
-        if results.multi_hand_landmarks:
-            hand_landmarks = results.multi_hand_landmarks[0]
-            fingers, pts = self.fingers_up(hand_landmarks.landmark, w, h)
+        if hand is not None:
+            fingers, pts, hand_landmarks = hand
             detected_fingers = fingers
 
             try:
@@ -764,34 +635,295 @@ class RamperVirtualPainter:
             if self.app_mode == "PAINTER":
                 self.handle_painter_gestures(fingers, current_time, frame, w)
             else:
+                self.undo_dwell.reset()
                 self.handle_chemistry_gestures(fingers, current_time, frame, w, thumb_tip)
 
-            self.mp_draw.draw_landmarks(frame, hand_landmarks, self.mp_hands.HAND_CONNECTIONS)
+            draw_hand_landmarks(frame, hand_landmarks)
 
         else:
             if time.time() - self.last_draw_time > self.draw_timeout:
                 self.prev_x, self.prev_y = None, None
             detected_fingers = None
             self.dragging_chemical = None
+            self.selection_dwell.reset()
+            self.undo_dwell.reset()
 
-        # Update chemistry reactions
-        if self.app_mode == "CHEMISTRY":
-            self.chemistry_engine.update_reactions(self.canvas)
+        # A stroke's history entry closes when the pen lifts
+        if self.prev_x is None and self.history.recording:
+            self.end_stroke()
+        prof.lap("gestures")
 
-        # Merge canvas with better blending
-        if self.app_mode == "PAINTER" or (self.chemistry_engine and self.chemistry_engine.active_reactions) or np.any(self.canvas > 0):
-             img_gray = cv2.cvtColor(self.canvas, cv2.COLOR_BGR2GRAY)
-             _, img_inv = cv2.threshold(img_gray, 50, 255, cv2.THRESH_BINARY_INV)
-             img_inv = cv2.cvtColor(img_inv, cv2.COLOR_GRAY2BGR)
-             frame = cv2.bitwise_and(frame, img_inv)
-             frame = cv2.bitwise_or(frame, self.canvas)
+        # Merge canvas, touching only the region that holds ink
+        self.composite_canvas(frame)
+        prof.lap("composite")
+
+        # Reaction effects go over the merged frame so they never persist
+        if self.app_mode == "CHEMISTRY":
+            self.chemistry_engine.update_reactions(frame)
+        prof.lap("reactions")
 
         # Draw status panel
         self.draw_status_panel(frame, w, h, detected_fingers)
+        prof.lap("status")
+        prof.end_frame()
+
+        if self.quality is not None and self.quality.observe(time.perf_counter() - start) is not None:
+            self.apply_quality(self.quality.settings(self.base_quality))
 
         return frame
 
+    def apply_quality(self, settings):
+        self.preprocessor.inference_width = settings["inference_width"]
+        self.inference_interval = settings["inference_interval"]
+        self.chemistry_engine.particles.set_budget(settings["particle_budget"])
+        print(f"[FunDraw_ChemLab] Quality tier {self.quality.tier}: model input "
+              f"{settings['inference_width'] or 'full'}, every {settings['inference_interval']} frame(s), "
+              f"{settings['particle_budget']} particles")
+
+    def apply_commands(self, batch):
+        # A batch holds every command queued since the last frame, with
+        # repeated commands merged (see commands.py)
+        reply = self.commands.reply
+        for cmd, error in batch.errors:
+            print(f"[FunDraw_ChemLab] Ignoring command: {error}")
+            if isinstance(cmd, dict):
+                reply(cmd.get("type"), False, error, [cmd["id"]] if "id" in cmd else [])
+            else:
+                reply(None, False, error)
+        ids = batch.ids
+
+        # Canvas commands run in the order they were queued
+        for step in batch.steps:
+            if step.kind == "save":
+                path = self.save_canvas(step.value)
+                if path:
+                    message = f"Saving {os.path.basename(path)}"
+                elif self.canvas is None:
+                    message = "Save skipped: nothing drawn yet"
+                else:
+                    message = "Save skipped: too many saves pending"
+                reply("save", path is not None, message, step.ids)
+            elif step.kind in ("undo", "redo"):
+                action = self.undo if step.kind == "undo" else self.redo
+                done = sum(1 for _ in range(step.count) if action())
+                reply(step.kind, True, f"{step.kind.capitalize()}: {done} step(s)", step.ids)
+            else:
+                # A mode switch clears the canvas too; each command type is
+                # acked with its own ids
+                if step.value is not None:
+                    self.switch_mode(step.value)
+                    reply("mode", True, f"Mode: {self.app_mode.lower()}", step.mode_ids)
+                else:
+                    self.clear_canvas()
+                if step.count:
+                    reply("clear", True, "Canvas cleared", step.ids)
+        if batch.brush_delta:
+            self.brush_thickness = max(2, min(60, self.brush_thickness + batch.brush_delta))
+            reply("brush_size", True, f"Brush size: {self.brush_thickness}", ids["brush_size"])
+        if batch.profiler is not None:
+            self.show_profiler = batch.profiler
+            reply("profiler", True, "Profiler on" if self.show_profiler else "Profiler off", ids["profiler"])
+        for fmt in batch.traces:
+            path = self.dump_trace(fmt)
+            reply("dump_trace", True, f"Trace written to {path}", ids["dump_trace"])
+
+    def dump_trace(self, fmt="json"):
+        os.makedirs(self.trace_dir, exist_ok=True)
+        fname = datetime.now().strftime(f"FunDraw_trace_%Y%m%d_%H%M%S.{fmt}")
+        path = self.profiler.dump(os.path.join(self.trace_dir, fname))
+        print(f"[FunDraw_ChemLab] Frame trace written to {path}")
+        return path
+
+    def should_run_inference(self, frame):
+        self.frames_since_inference += 1
+        if self.inference_interval <= 1:
+            return True
+        # Score every frame so the motion reference stays one frame old
+        moved = False
+        if self.motion_threshold is not None:
+            moved = self.motion_detector.score(frame) > self.motion_threshold
+        return moved or self.frames_since_inference >= self.inference_interval
+
+    def detect_hand(self, frame, w, h, inference_rgb=None):
+        # Returns (fingers, pts, hand_landmarks) or None
+        now = time.time()
+        results = None
+        if self.should_run_inference(frame):
+            self.frames_since_inference = 0
+            # A decoder-provided input covers the whole frame, so it is only
+            # used while no ROI crop is active
+            mirrored = inference_rgb is not None and self.preprocessor.roi is None
+            if mirrored:
+                rgb = inference_rgb() if callable(inference_rgb) else inference_rgb
+                crop = (0, 0, w, h)
+            else:
+                rgb, crop = self.preprocessor.prepare(frame)
+            self.profiler.lap("preprocess")
+            if getattr(self.hands, "takes_context", False):
+                # The context says where the input came from. Asynchronous
+                # trackers return it with the result, which may belong to an
+                # earlier frame; the recorder maps landmarks with it.
+                results = self.hands.process(rgb, (crop, w, h, mirrored))
+            else:
+                results = self.hands.process(rgb)
+            self.profiler.lap("inference")
+
+        # A pooled tracker that timed out counts as a skipped frame
+        if results is not None and results is not STALE:
+            if not results.multi_hand_landmarks:
+                self.last_hand = None
+                self.landmark_predictor.reset()
+                self.preprocessor.reset()
+                return None
+
+            crop_w, crop_h = w, h
+            if getattr(results, "context", None) is not None:
+                crop, crop_w, crop_h, mirrored = results.context
+            hand_landmarks = self.preprocessor.map_landmarks(results.multi_hand_landmarks[0], crop,
+                                                             crop_w, crop_h, mirrored)
+            fingers, pts = self.fingers_up(hand_landmarks.landmark, w, h)
+            self.preprocessor.observe(pts, hand_confidence(results), now, w, h)
+            self.landmark_predictor.observe([pts[i] for i in TRACKED_LANDMARKS], now)
+            self.last_hand = (fingers, pts, hand_landmarks)
+            return self.last_hand
+
+        if self.last_hand is None:
+            return None
+
+        # Skipped frame: keep the last finger state, move the tracked tips
+        fingers, pts, hand_landmarks = self.last_hand
+        predicted = self.landmark_predictor.predict(now)
+        if predicted is not None:
+            pts = list(pts)
+            for i, (px, py) in zip(TRACKED_LANDMARKS, predicted):
+                pts[i] = (int(px), int(py))
+        return fingers, pts, hand_landmarks
+
+    def resize_canvas(self, shape):
+        # Keeps the drawing when the frame size changes (e.g. the working
+        # resolution drops) by replaying the stroke log at the new size, so
+        # repeated changes do not blur it; undo history is lost
+        old, bbox = self.canvas, self.ink_bbox
+        log = self.stroke_log.snapshot()
+        self.reset_canvas(shape)
+        self.prev_x, self.prev_y = None, None
+        self.last_hand = None
+        self.landmark_predictor.reset()
+        self.preprocessor.reset()
+        if old is None or bbox is None:
+            return
+        h, w = shape[:2]
+        sx, sy = w / old.shape[1], h / old.shape[0]
+        log.rescale(w, h)
+        log.replay(self.canvas)
+        self.stroke_log.strokes = log.strokes
+        x1, y1, x2, y2 = bbox
+        self.ink_bbox = (int(x1 * sx), int(y1 * sy), min(w, int(math.ceil(x2 * sx)) + 1), min(h, int(math.ceil(y2 * sy)) + 1))
+        self.mark_canvas_dirty(*self.ink_bbox)
+
+    def reset_canvas(self, shape):
+        self.canvas = np.zeros(shape, dtype=np.uint8)
+        self.stroke_log.reset(shape[1], shape[0])
+        self.history.reset()
+        self.ink_mask = np.zeros(shape[:2], dtype=np.uint8)
+        self.ink_bbox = None
+        self.dirty_bbox = None
+
+    def switch_mode(self, mode):
+        # The other mode starts from an empty canvas and an empty history, so
+        # undo cannot bring one mode's drawing back into the other
+        self.app_mode = mode
+        self.clear_canvas(undoable=False)
+
+    def clear_canvas(self, undoable=True):
+        # A user clear is recorded like a stroke, so it can be undone; other
+        # clears (mode switches, lab reset) drop the history instead
+        if self.canvas is None:
+            return
+        self.end_stroke()
+        if not undoable:
+            self.history.reset()
+        if self.ink_bbox is not None:
+            x1, y1, x2, y2 = self.ink_bbox
+            if undoable:
+                self.history.begin(self.stroke_log)
+                self.history.touch(self.canvas, self.ink_bbox)
+                self.history.end()
+            self.canvas[y1:y2, x1:x2] = 0
+            self.ink_mask[y1:y2, x1:x2] = 0
+        self.stroke_log.strokes = []
+        self.ink_bbox = None
+        self.dirty_bbox = None
+
+    def end_stroke(self):
+        self.history.end()
+        self.stroke_log.end_stroke()
+
+    def undo(self):
+        if self.canvas is None:
+            return False
+        self.end_stroke()
+        self.prev_x, self.prev_y = None, None
+        restored = self.history.undo(self.canvas, self.stroke_log)
+        if restored is not None:
+            self.mark_canvas_dirty(*restored)
+        return restored is not None
+
+    def redo(self):
+        if self.canvas is None:
+            return False
+        self.end_stroke()
+        self.prev_x, self.prev_y = None, None
+        restored = self.history.redo(self.canvas, self.stroke_log)
+        if restored is not None:
+            self.mark_canvas_dirty(*restored)
+        return restored is not None
+
+    def mark_canvas_dirty(self, x1, y1, x2, y2):
+        if self.canvas is None:
+            return
+        h, w = self.canvas.shape[:2]
+        x1, y1 = max(0, int(x1)), max(0, int(y1))
+        x2, y2 = min(w, int(x2)), min(h, int(y2))
+        if x1 >= x2 or y1 >= y2:
+            return
+        self.dirty_bbox = union_bbox(self.dirty_bbox, (x1, y1, x2, y2))
+        self.ink_bbox = union_bbox(self.ink_bbox, (x1, y1, x2, y2))
+
+    def composite_canvas(self, frame):
+        # Refresh the ink mask only where the canvas changed
+        if self.dirty_bbox is not None:
+            x1, y1, x2, y2 = self.dirty_bbox
+            gray = cv2.cvtColor(self.canvas[y1:y2, x1:x2], cv2.COLOR_BGR2GRAY)
+            cv2.threshold(gray, 50, 255, cv2.THRESH_BINARY, dst=self.ink_mask[y1:y2, x1:x2])
+            self.dirty_bbox = None
+
+        if self.ink_bbox is None:
+            return
+
+        # Inked pixels show the canvas, faint ones are OR-ed over the video
+        x1, y1, x2, y2 = self.ink_bbox
+        roi = frame[y1:y2, x1:x2]
+        art = self.canvas[y1:y2, x1:x2]
+        cv2.bitwise_or(roi, art, dst=roi)
+        cv2.copyTo(art, self.ink_mask[y1:y2, x1:x2], roi)
+
     def handle_painter_gestures(self, fingers, current_time, frame, w):
+        # Undo: index, middle and ring up; fires once per gesture, after the
+        # pose has been held for the undo dwell
+        if fingers[1] == 1 and fingers[2] == 1 and fingers[3] == 1 and fingers[4] == 0:
+            if self.mode != "IDLE" and current_time - self.last_mode_change > self.mode_debounce:
+                self.mode = "IDLE"
+                self.last_mode_change = current_time
+            self.selection_dwell.reset()
+            if current_time - self.last_draw_time > self.draw_timeout:
+                self.prev_x, self.prev_y = None, None
+            if self.undo_dwell.update("undo", current_time):
+                if self.undo():
+                    print("[FunDraw_ChemLab] Undo.")
+            return
+        self.undo_dwell.reset()
+
         # Selection mode: index and middle up
         if fingers[1] == 1 and fingers[2] == 1:
             if current_time - self.last_mode_change > self.mode_debounce:
@@ -810,15 +942,19 @@ class RamperVirtualPainter:
         # Act on mode
         if self.mode == "SELECT":
             cv2.circle(frame, (self.smoothed_x, self.smoothed_y), 16, (0, 255, 0), 3)
-            if self.smoothed_y <= self.toolbar_height:
-                self.select_from_painter_toolbar(self.smoothed_x, self.smoothed_y, w)
+            if self.in_toolbar(self.smoothed_y):
+                target = self.painter_toolbar_target(self.smoothed_x, self.smoothed_y)
+                if self.selection_dwell.update(target, current_time):
+                    self.apply_painter_selection(target)
                 cv2.putText(frame, f"Selected: {self.color_names[self.selected_color_idx]}",
                             (15, self.toolbar_height + self.instruction_height + 15), 
                             cv2.FONT_HERSHEY_SIMPLEX, 0.6, (220, 220, 220), 2, cv2.LINE_AA)
-                time.sleep(0.09)
+            else:
+                self.selection_dwell.reset()
             self.prev_x, self.prev_y = None, None
 
         elif self.mode == "DRAW":
+            self.selection_dwell.reset()
             draw_color = (0, 0, 0) if self.is_eraser else self.selected_color
             thickness = self.eraser_thickness if self.is_eraser else self.brush_thickness
             cv2.circle(frame, (self.smoothed_x, self.smoothed_y), max(8, thickness // 2), draw_color, 2)
@@ -837,10 +973,11 @@ class RamperVirtualPainter:
                 if current_time - self.last_draw_time > self.draw_timeout:
                     self.prev_x, self.prev_y = None, None
         else:  # IDLE
+            self.selection_dwell.reset()
             if current_time - self.last_draw_time > self.draw_timeout:
                 self.prev_x, self.prev_y = None, None
 
-    def handle_chemistry_gestures(self, current_time, frame, w, thumb_tip):
+    def handle_chemistry_gestures(self, fingers, current_time, frame, w, thumb_tip):
         # Chemical selection: two fingers up (index + middle)
         if fingers[1] == 1 and fingers[2] == 1 and not self.dragging_chemical:
             if current_time - self.last_mode_change > self.mode_debounce:
@@ -866,14 +1003,19 @@ class RamperVirtualPainter:
         # Act on mode
         if self.mode == "SELECT":
             cv2.circle(frame, (self.smoothed_x, self.smoothed_y), 16, (0, 255, 0), 3)
-            if self.smoothed_y <= self.toolbar_height:
-                self.select_from_chemistry_toolbar(self.smoothed_x, self.smoothed_y, w)
+            if self.in_toolbar(self.smoothed_y):
+                target = self.chemistry_toolbar_target(self.smoothed_x, self.smoothed_y)
+                if self.selection_dwell.update(target, current_time):
+                    self.apply_chemistry_selection(target)
                 cv2.putText(frame, f"Selected: {self.selected_chemical}",
                             (15, self.toolbar_height + self.instruction_height + 15), 
                             cv2.FONT_HERSHEY_SIMPLEX, 0.6, (200, 255, 200), 2, cv2.LINE_AA)
-                time.sleep(0.09)
+            else:
+                self.selection_dwell.reset()
+        else:
+            self.selection_dwell.reset()
 
-        elif self.mode == "DRAG" and self.dragging_chemical:
+        if self.mode == "DRAG" and self.dragging_chemical:
             # Show dragging cursor with chemical name
             cv2.circle(frame, (self.smoothed_x, self.smoothed_y), 22, (255, 255, 0), 3)
             cv2.putText(frame, self.dragging_chemical[:10], 
@@ -884,14 +1026,13 @@ class RamperVirtualPainter:
             beaker_idx = self.find_beaker_at_position(self.smoothed_x, self.smoothed_y)
             if beaker_idx is not None:
                 # Highlight beaker
-                pos = self.beakers[beaker_idx]["pos"]
-                radius = self.beakers[beaker_idx]["radius"]
+                pos = self.beakers[beaker_idx].pos
+                radius = self.beakers[beaker_idx].radius
                 cv2.circle(frame, pos, radius + 8, (255, 255, 0), 4)
                 
                 # Drop chemical into beaker
                 if fingers[0] == 0 or fingers[1] == 0:  # Release pinch
-                    if self.dragging_chemical not in self.beakers[beaker_idx]["chemicals"]:
-                        self.beakers[beaker_idx]["chemicals"].append(self.dragging_chemical)
+                    if self.beakers[beaker_idx].add(self.dragging_chemical, self.catalog):
                         print(f"[FunDraw_ChemLab] Added {self.dragging_chemical} to Beaker {beaker_idx + 1}")
                     self.dragging_chemical = None
 
@@ -935,6 +1076,14 @@ class RamperVirtualPainter:
             cv2.putText(frame, f"Lab Size: {w}x{h}", (status_x + 15, status_y + 120),
                         cv2.FONT_HERSHEY_SIMPLEX, 0.6, (180, 180, 180), 1)
 
+        if self.show_profiler:
+            self.profiler.draw_overlay(frame, status_x, status_y - 10, status_width)
+
+        # Last save result, shown for a few seconds
+        if self.save_notice is not None and time.time() - self.save_notice[1] < 3:
+            cv2.putText(frame, self.save_notice[0], (15, h - 40),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (100, 255, 100), 1)
+
         # Show finger detection in bottom left
         if detected_fingers is not None:
             finger_status = "".join(["1" if f else "0" for f in detected_fingers])
@@ -944,24 +1093,21 @@ class RamperVirtualPainter:
     def draw_smooth_line(self, img, start_pos, end_pos, color, thickness):
         if start_pos is None or end_pos is None:
             return
-        x0, y0 = int(start_pos[0]), int(start_pos[1])
-        x1, y1 = int(end_pos[0]), int(end_pos[1])
-        dist = int(np.hypot(x1 - x0, y1 - y0))
-        if dist == 0:
-            cv2.circle(img, (x1, y1), thickness // 2, color, -1)
-            return
-        steps = max(1, dist // 2)
-        for i in range(steps + 1):
-            t = i / steps
-            xi = int(x0 + (x1 - x0) * t)
-            yi = int(y0 + (y1 - y0) * t)
-            cv2.circle(img, (xi, yi), thickness // 2, color, -1)
+        if img is self.canvas:
+            bounds = strokes.segment_bounds(start_pos, end_pos, thickness)
+            self.history.begin(self.stroke_log)
+            self.history.touch(img, bounds)
+            self.mark_canvas_dirty(*bounds)
+            self.stroke_log.add_segment(start_pos, end_pos, color, thickness, self.is_eraser)
+        strokes.draw_segment(img, start_pos, end_pos, color, thickness)
 
 
 
-    def run(self):
-        print("🎨 FunDraw_ChemLab — AI Virtual Painter & Chemistry Lab (Press 'q' to quit)")
-        
+    def close(self):
+        self.hands.close()
+        self.saver.close()
+
+    def open_camera(self):
         # Local execution only
         if self.cam_index is None:
             self.cam_index = 0
@@ -971,65 +1117,110 @@ class RamperVirtualPainter:
         cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
         
         # Set window to fullscreen for better utilization
-        cv2.namedWindow("FunDraw_ChemLab - AI Virtual Painter & Chemistry Lab", cv2.WINDOW_NORMAL)
-        cv2.setWindowProperty("FunDraw_ChemLab - AI Virtual Painter & Chemistry Lab", cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
-        
-        while True:
-            success, frame = cap.read()
-            if not success:
-                print("Cannot read camera. Exiting.")
-                break
-            
-            # process_frame handles flipping and logic
-            # Note: process_frame flips input, but here we read raw which is usually not mirrored.
-            # So process_frame flipping it will mirror it (good for selfie view).
-            processed_frame = self.process_frame(frame)
-
-            cv2.imshow("FunDraw_ChemLab - AI Virtual Painter & Chemistry Lab", processed_frame)
-
-            # Key handling
-            key = cv2.waitKey(1) & 0xFF
-            if key == ord('q') or key == 27:  # 'q' or ESC to quit
-                break
-            elif key == ord('f'):  # Toggle fullscreen
-                cv2.setWindowProperty("FunDraw_ChemLab - AI Virtual Painter & Chemistry Lab", 
-                                    cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_NORMAL)
-            elif key == ord('c') and self.app_mode == "PAINTER":
-                self.canvas = np.zeros_like(self.canvas)
-                print("[FunDraw_ChemLab] Canvas cleared.")
-            elif key == ord('r') and self.app_mode == "CHEMISTRY":
-                # Reset chemistry lab
-                for beaker in self.beakers:
-                    beaker["chemicals"] = []
-                self.chemistry_engine.active_reactions = []
-                self.canvas = np.zeros_like(self.canvas)
-                print("[FunDraw_ChemLab] Chemistry lab reset.")
-            elif key == ord('s'):
-                self.save_canvas()
-            elif key == ord('l'):
-                # Toggle between modes
-                self.app_mode = "CHEMISTRY" if self.app_mode == "PAINTER" else "PAINTER"
-                self.canvas = np.zeros_like(self.canvas)
-                print(f"[FunDraw_ChemLab] Switched to {self.app_mode} mode.")
-            elif key == ord('+') or key == ord('='):
-                if self.app_mode == "PAINTER":
-                    self.brush_thickness = min(self.brush_thickness + 2, 60)
-                    print(f"[FunDraw_ChemLab] Brush thickness: {self.brush_thickness}")
-            elif key == ord('-') or key == ord('_'):
-                if self.app_mode == "PAINTER":
-                    self.brush_thickness = max(self.brush_thickness - 2, 2)
-                    print(f"[FunDraw_ChemLab] Brush thickness: {self.brush_thickness}")
-            elif key == ord('e') and self.app_mode == "PAINTER":
-                self.is_eraser = not self.is_eraser
-                print("[FunDraw_ChemLab] Eraser:", self.is_eraser)
+        cv2.namedWindow(WINDOW_NAME, cv2.WINDOW_NORMAL)
+        cv2.setWindowProperty(WINDOW_NAME, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
+        return cap
+
+    def handle_key(self, key):
+        # Returns False when the user asked to quit
+        if key == ord('q') or key == 27:  # 'q' or ESC to quit
+            return False
+        elif key == ord('f'):  # Toggle fullscreen
+            cv2.setWindowProperty(WINDOW_NAME, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_NORMAL)
+        elif key == ord('c') and self.app_mode == "PAINTER":
+            self.clear_canvas()
+            print("[FunDraw_ChemLab] Canvas cleared.")
+        elif key == ord('r') and self.app_mode == "CHEMISTRY":
+            # Reset chemistry lab
+            for beaker in self.beakers:
+                beaker.empty()
+            self.chemistry_engine.reset()
+            self.clear_canvas(undoable=False)
+            print("[FunDraw_ChemLab] Chemistry lab reset.")
+        elif key == ord('s'):
+            self.save_canvas()
+        elif key == ord('v'):
+            self.save_canvas("svg")
+        elif key == ord('z'):
+            if self.undo():
+                print("[FunDraw_ChemLab] Undo.")
+        elif key == ord('y'):
+            if self.redo():
+                print("[FunDraw_ChemLab] Redo.")
+        elif key == ord('l'):
+            # Toggle between modes
+            self.switch_mode("CHEMISTRY" if self.app_mode == "PAINTER" else "PAINTER")
+            print(f"[FunDraw_ChemLab] Switched to {self.app_mode} mode.")
+        elif key == ord('+') or key == ord('='):
+            if self.app_mode == "PAINTER":
+                self.brush_thickness = min(self.brush_thickness + 2, 60)
+                print(f"[FunDraw_ChemLab] Brush thickness: {self.brush_thickness}")
+        elif key == ord('-') or key == ord('_'):
+            if self.app_mode == "PAINTER":
+                self.brush_thickness = max(self.brush_thickness - 2, 2)
+                print(f"[FunDraw_ChemLab] Brush thickness: {self.brush_thickness}")
+        elif key == ord('e') and self.app_mode == "PAINTER":
+            self.is_eraser = not self.is_eraser
+            print("[FunDraw_ChemLab] Eraser:", self.is_eraser)
+        elif key == ord('p'):
+            self.show_profiler = not self.show_profiler
+        elif key == ord('t'):
+            self.dump_trace()
+        return True
+
+    def run(self, pipelined=False):
+        print("🎨 FunDraw_ChemLab — AI Virtual Painter & Chemistry Lab (Press 'q' to quit)")
+        cap = self.open_camera()
+
+        if pipelined:
+            # Capture, processing and display overlap on separate threads
+            runner = PipelinedRunner(self, cap, WINDOW_NAME)
+            runner.run()
+            runner.print_stage_stats()
+        else:
+            while True:
+                success, frame = cap.read()
+                if not success:
+                    print("Cannot read camera. Exiting.")
+                    break
+                
+                # process_frame handles flipping and logic
+                # Note: process_frame flips input, but here we read raw which is usually not mirrored.
+                # So process_frame flipping it will mirror it (good for selfie view).
+                processed_frame = self.process_frame(frame)
+
+                cv2.imshow(WINDOW_NAME, processed_frame)
+
+                # Key handling
+                key = cv2.waitKey(1) & 0xFF
+                if not self.handle_key(key):
+                    break
 
         cap.release()
         cv2.destroyAllWindows()
+        self.close()
 
 
 if __name__ == "__main__":
-    app = RamperVirtualPainter()
-    app.run()
+    parser = argparse.ArgumentParser(description="FunDraw_ChemLab native app")
+    parser.add_argument("--cam", type=int, default=0, help="camera index")
+    parser.add_argument("--pipelined", action="store_true",
+                        help="run capture, processing and display on separate threads")
+    parser.add_argument("--reactions", help="reaction catalog (JSON or CSV, default: reactions.json)")
+    parser.add_argument("--chemicals", help="chemical catalog (JSON or CSV, default: chemicals.json)")
+    parser.add_argument("--save-format", choices=["png", "webp", "jpeg"], default="png",
+                        help="raster format for the S key (V saves the stroke log as SVG)")
+    parser.add_argument("--save-level", type=int, default=None,
+                        help="PNG compression (0-9) or WebP/JPEG quality (0-100)")
+    parser.add_argument("--target-fps", type=float, default=None,
+                        help="lower tracking and rendering quality when frames fall behind this rate")
+    args = parser.parse_args()
+
+    quality = QualityController(target_fps=args.target_fps) if args.target_fps else None
+    app = RamperVirtualPainter(cam_index=args.cam, reaction_catalog=args.reactions,
+                               chemical_catalog=args.chemicals, save_format=args.save_format,
+                               save_level=args.save_level, quality=quality)
+    app.run(pipelined=args.pipelined)
 
 '''
 Index finger → Draw
@@ -1037,6 +1228,8 @@ Index + Middle → Select colors
 C → Clear canvas
 +/- → Brush size
 S → Save painting
+V → Save strokes as SVG
+Z / Y → Undo / redo (three fingers up also undoes)
 
 Chemistry Mode:
 
@@ -1048,6 +1241,8 @@ S → Save experiment
 Global:
 
 L → Toggle between modes
+P → Toggle frame profiler overlay
+T → Export frame timing trace
 Q → Quit application
 
 
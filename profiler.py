@@ -0,0 +1,140 @@
+import csv
+import json
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# Per-stage frame timing. Stages are recorded either as laps inside a frame
+# (begin_frame() then lap("stage") after each section) or directly with
+# record(). The last `capacity` samples of every stage are kept in a ring
+# buffer for rolling percentiles, the on-screen overlay and trace export.
+
+# Trace export formats accepted by dump() (chosen by file extension)
+TRACE_FORMATS = ("json", "csv")
+
+class FrameProfiler:
+    def __init__(self, capacity=600):
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.durations = {}
+        self.frame_ids = {}
+        self.counts = {}
+        self.order = []
+        self.frame_id = 0
+        self.frame_start = None
+        self.last_lap = None
+
+    def begin_frame(self):
+        self.frame_id += 1
+        self.frame_start = self.last_lap = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        if self.last_lap is not None:
+            self.record(stage, now - self.last_lap)
+        self.last_lap = now
+
+    def end_frame(self):
+        if self.frame_start is not None:
+            self.record("total", time.perf_counter() - self.frame_start)
+        self.frame_start = self.last_lap = None
+
+    def record(self, stage, seconds):
+        with self.lock:
+            if stage not in self.durations:
+                self.durations[stage] = np.zeros(self.capacity, dtype=np.float32)
+                self.frame_ids[stage] = np.zeros(self.capacity, dtype=np.int64)
+                self.counts[stage] = 0
+                self.order.append(stage)
+            slot = self.counts[stage] % self.capacity
+            self.durations[stage][slot] = seconds
+            self.frame_ids[stage][slot] = self.frame_id
+            self.counts[stage] += 1
+
+    def samples(self, stage):
+        # Recorded durations of a stage in seconds, oldest first
+        with self.lock:
+            count = self.counts.get(stage, 0)
+            if count == 0:
+                return np.zeros(0, dtype=np.float32)
+            if count <= self.capacity:
+                return self.durations[stage][:count].copy()
+            slot = count % self.capacity
+            return np.roll(self.durations[stage], -slot)
+
+    def summary(self):
+        # {stage: {count, mean_ms, p50_ms, p95_ms, p99_ms}} over the ring buffer
+        out = {}
+        for stage in list(self.order):
+            values = self.samples(stage)
+            if len(values) == 0:
+                continue
+            p50, p95, p99 = np.percentile(values, (50, 95, 99)) * 1000
+            out[stage] = {
+                "count": self.counts[stage],
+                "mean_ms": float(values.mean() * 1000),
+                "p50_ms": float(p50),
+                "p95_ms": float(p95),
+                "p99_ms": float(p99),
+            }
+        return out
+
+    def reset(self):
+        with self.lock:
+            self.durations.clear()
+            self.frame_ids.clear()
+            self.counts.clear()
+            self.order.clear()
+
+    def dump(self, path):
+        # .csv: one row per sample (frame, stage, ms); anything else: JSON with
+        # the percentile summary plus the raw samples
+        with self.lock:
+            rows = []
+            for stage in self.order:
+                count = self.counts[stage]
+                n = min(count, self.capacity)
+                for i in range(count - n, count):
+                    slot = i % self.capacity
+                    rows.append((int(self.frame_ids[stage][slot]), stage,
+                                 float(self.durations[stage][slot]) * 1000))
+        rows.sort(key=lambda r: r[0])
+
+        if path.lower().endswith(".csv"):
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["frame", "stage", "ms"])
+                for frame_id, stage, ms in rows:
+                    writer.writerow([frame_id, stage, f"{ms:.4f}"])
+        else:
+            trace = {
+                "summary": self.summary(),
+                "samples": [{"frame": f, "stage": s, "ms": round(ms, 4)} for f, s, ms in rows],
+            }
+            with open(path, "w") as f:
+                json.dump(trace, f, indent=1)
+        return path
+
+    def draw_overlay(self, frame, x, y, width):
+        # Table of p50/p95/p99 per stage, drawn upwards from (x, y)
+        summary = self.summary()
+        if not summary:
+            return
+        line_h = 18
+        height = line_h * (len(summary) + 1) + 16
+        top = max(0, y - height)
+        cv2.rectangle(frame, (x, top), (x + width, y), (25, 25, 25), -1)
+        cv2.rectangle(frame, (x, top), (x + width, y), (100, 100, 100), 2)
+
+        # Hershey fonts are proportional, so every column gets its own x
+        col_x = [x + 10] + [x + width - 10 - 50 * (3 - i) for i in range(3)]
+        header = ["stage ms", "p50", "p95", "p99"]
+        for cx, text in zip(col_x, header):
+            cv2.putText(frame, text, (cx, top + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (200, 200, 200), 1)
+        for i, (stage, s) in enumerate(summary.items()):
+            row_y = top + 20 + line_h * (i + 1)
+            values = [stage[:12], f"{s['p50_ms']:.1f}", f"{s['p95_ms']:.1f}", f"{s['p99_ms']:.1f}"]
+            for cx, text in zip(col_x, values):
+                cv2.putText(frame, text, (cx, row_y), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (180, 180, 180), 1)
@@ -0,0 +1,86 @@
+import random
+
+# Quality tiers, best first. Each step gives up a little more: first the hand
+# model input size, then how often the model runs, then the reaction particle
+# budget. The painter itself always works at the display resolution; its
+# drawing is ROI-limited, so scaling the frame down and back up would cost
+# more than it saves and shrink the UI.
+QUALITY_TIERS = [
+    {"inference_width": None, "inference_interval": 1, "particle_budget": 1500},
+    {"inference_width": 640, "inference_interval": 1, "particle_budget": 1500},
+    {"inference_width": 480, "inference_interval": 2, "particle_budget": 1500},
+    {"inference_width": 320, "inference_interval": 3, "particle_budget": 800},
+    {"inference_width": 320, "inference_interval": 4, "particle_budget": 400},
+    {"inference_width": 320, "inference_interval": 6, "particle_budget": 200},
+]
+
+def combine_settings(base, tier):
+    # The lower quality of the two for every knob, so a tier never raises a
+    # session above the settings it was created with
+    widths = [w for w in (base.get("inference_width"), tier["inference_width"]) if w is not None]
+    return {
+        "inference_width": min(widths) if widths else None,
+        "inference_interval": max(base.get("inference_interval", 1), tier["inference_interval"]),
+        "particle_budget": min(base.get("particle_budget", tier["particle_budget"]), tier["particle_budget"]),
+    }
+
+class QualityController:
+    # Steps through QUALITY_TIERS from measured per-frame processing time.
+    # A tier is dropped once the average over `window` frames exceeds
+    # `high` of the frame budget, and regained only after the average has
+    # stayed below `low` for `recover` windows; the gap between the two
+    # thresholds and the slow recovery keep it from oscillating. Recovery
+    # holds are jittered so sessions sharing one server do not all step
+    # back up on the same frame.
+    def __init__(self, target_fps=24.0, tiers=QUALITY_TIERS, window=30, high=0.9, low=0.6,
+                 recover=4, seed=None):
+        self.budget = 1.0 / target_fps
+        self.tiers = tiers
+        self.window = window
+        self.high = high
+        self.low = low
+        self.recover = recover
+        self.rng = random.Random(seed)
+        self.tier = 0
+        self.changes = 0
+        self.reset_window()
+
+    def reset_window(self):
+        self.frames = 0
+        self.total = 0.0
+        self.calm_windows = 0
+        self.hold = self.recover + self.rng.randint(0, self.recover)
+
+    def settings(self, base=None):
+        return combine_settings(base or {}, self.tiers[self.tier])
+
+    def observe(self, seconds):
+        # Returns the new tier index when it changes, otherwise None
+        self.frames += 1
+        self.total += seconds
+        if self.frames < self.window:
+            return None
+        load = self.total / self.frames / self.budget
+        self.frames = 0
+        self.total = 0.0
+
+        if load > self.high:
+            if self.tier + 1 < len(self.tiers):
+                return self.step(1)
+            self.calm_windows = 0
+        elif load < self.low and self.tier > 0:
+            self.calm_windows += 1
+            if self.calm_windows >= self.hold:
+                return self.step(-1)
+        else:
+            self.calm_windows = 0
+        return None
+
+    def step(self, delta):
+        self.tier += delta
+        self.changes += 1
+        self.reset_window()
+        return self.tier
+
+    def stats(self):
+        return {"tier": self.tier, "tiers": len(self.tiers), "changes": self.changes}
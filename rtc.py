@@ -0,0 +1,66 @@
+import json
+import os
+import threading
+import time
+
+# ICE (STUN/TURN) servers for the WebRTC connection. Streamlit reruns app.py on
+# every widget interaction, so the server list is fetched once and cached for
+# ttl seconds instead of calling Twilio on each rerun.
+DEFAULT_ICE_SERVERS = [
+    {"urls": ["stun:stun.l.google.com:19302"]},
+    {"urls": ["stun:stun1.l.google.com:19302"]},
+    {"urls": ["stun:stun2.l.google.com:19302"]},
+]
+
+def twilio_ice_servers(account_sid, auth_token):
+    # TURN credentials from Twilio; crucial for cloud deployment where STUN
+    # is not enough. The client library is only imported when used.
+    from twilio.rest import Client
+    return Client(account_sid, auth_token).tokens.create().ice_servers
+
+def default_provider(environ=os.environ):
+    # FUNDRAW_ICE_SERVERS (a JSON list) is a local stand-in that skips Twilio,
+    # e.g. for tests or a self-hosted TURN server
+    if environ.get("FUNDRAW_ICE_SERVERS"):
+        servers = json.loads(environ["FUNDRAW_ICE_SERVERS"])
+        return lambda: servers
+    if "TWILIO_ACCOUNT_SID" in environ and "TWILIO_AUTH_TOKEN" in environ:
+        sid, token = environ["TWILIO_ACCOUNT_SID"], environ["TWILIO_AUTH_TOKEN"]
+        return lambda: twilio_ice_servers(sid, token)
+    return None
+
+class IceServerCache:
+    # provider() returns a list of ICE server dicts. Failed fetches fall back
+    # to the public STUN servers and are retried after retry seconds.
+    def __init__(self, provider=None, ttl=3600.0, retry=60.0, fallback=DEFAULT_ICE_SERVERS, clock=time.time):
+        self.provider = provider
+        self.ttl = ttl
+        self.retry = retry
+        self.fallback = fallback
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.servers = None
+        self.expires = 0.0
+        self.fetches = 0
+
+    def get(self):
+        with self.lock:
+            now = self.clock()
+            if self.servers is not None and now < self.expires:
+                return self.servers
+            if self.provider is None:
+                self.servers, self.expires = self.fallback, float("inf")
+                return self.servers
+            self.fetches += 1
+            try:
+                self.servers = self.provider()
+                self.expires = now + self.ttl
+            except Exception as e:
+                print(f"[FunDraw_ChemLab] Error fetching ICE servers: {e}")
+                self.servers = self.fallback
+                self.expires = now + self.retry
+            return self.servers
+
+    def invalidate(self):
+        with self.lock:
+            self.expires = 0.0
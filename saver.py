@@ -0,0 +1,141 @@
+import os
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# Extension, OpenCV encoder flag and default level for each save format
+SAVE_FORMATS = {
+    "png": (".png", cv2.IMWRITE_PNG_COMPRESSION, 3),
+    "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY, 90),
+    "jpeg": (".jpg", cv2.IMWRITE_JPEG_QUALITY, 92),
+}
+
+def encode_image(snapshot, ext, params):
+    pixels, shape, origin = snapshot
+    if shape is not None:
+        image = np.zeros(shape, dtype=pixels.dtype)
+        x, y = origin
+        image[y:y + pixels.shape[0], x:x + pixels.shape[1]] = pixels
+        pixels = image
+    ok, data = cv2.imencode(ext, pixels, params)
+    if not ok:
+        raise IOError("encoder failed")
+    return data.tobytes()
+
+class SaveResult:
+    def __init__(self, path, ok, error=None, elapsed=0.0):
+        self.path = path
+        self.ok = ok
+        self.error = error
+        self.elapsed = elapsed
+
+    def message(self):
+        if self.ok:
+            return f"Saved {os.path.basename(self.path)} ({self.elapsed * 1000:.0f} ms)"
+        return f"Save failed: {self.error}"
+
+class AsyncImageSaver:
+    # Encodes and writes images on background threads so saving never
+    # blocks the frame loop. The caller hands over a snapshot; the queue is
+    # bounded, and a save is refused rather than queued when it is full.
+    # on_complete(result) runs on the worker thread.
+    def __init__(self, workers=1, max_pending=4, fmt="png", level=None, on_complete=None):
+        if fmt not in SAVE_FORMATS:
+            raise ValueError(f"unknown save format {fmt!r}, expected one of {sorted(SAVE_FORMATS)}")
+        self.fmt = fmt
+        self.level = level
+        self.on_complete = on_complete
+        self.jobs = queue.Queue(maxsize=max_pending)
+        self.lock = threading.Lock()
+        self.last_result = None
+        self.saved = 0
+        self.failed = 0
+        self.rejected = 0
+
+        self.workers = []
+        for i in range(workers):
+            t = threading.Thread(target=self._worker, name=f"image-saver-{i}", daemon=True)
+            t.start()
+            self.workers.append(t)
+
+    def save(self, image, path_stem, fmt=None, level=None, bbox=None):
+        # Returns the target path, or None when the queue is full. With bbox,
+        # only that region is copied now and the rest of the image is written
+        # as black, which is how the canvas looks outside its ink.
+        fmt = fmt or self.fmt
+        if fmt not in SAVE_FORMATS:
+            raise ValueError(f"unknown save format {fmt!r}, expected one of {sorted(SAVE_FORMATS)}")
+        ext, flag, default = SAVE_FORMATS[fmt]
+        if level is None:
+            level = self.level if self.level is not None and fmt == self.fmt else default
+        path = path_stem + ext
+
+        if bbox is None:
+            snapshot = (image.copy(), None, None)
+        else:
+            x1, y1, x2, y2 = bbox
+            snapshot = (image[y1:y2, x1:x2].copy(), image.shape, (x1, y1))
+        params = [flag, int(level)]
+        return self.save_data(path, lambda: encode_image(snapshot, ext, params))
+
+    def save_data(self, path, encode):
+        # encode() runs on a worker and returns the file's bytes; it must
+        # only touch data the caller has already snapshotted
+        try:
+            self.jobs.put_nowait((encode, path))
+        except queue.Full:
+            with self.lock:
+                self.rejected += 1
+            return None
+        return path
+
+    def pending(self):
+        return self.jobs.unfinished_tasks
+
+    def _worker(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                self.jobs.task_done()
+                return
+            encode, path = job
+            start = time.perf_counter()
+            try:
+                data = encode()
+                tmp = path + ".part"
+                with open(tmp, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, path)
+                result = SaveResult(path, True, elapsed=time.perf_counter() - start)
+            except Exception as e:
+                result = SaveResult(path, False, error=str(e), elapsed=time.perf_counter() - start)
+
+            with self.lock:
+                self.last_result = result
+                if result.ok:
+                    self.saved += 1
+                else:
+                    self.failed += 1
+            if self.on_complete is not None:
+                try:
+                    self.on_complete(result)
+                except Exception as e:
+                    print(f"[FunDraw_ChemLab] Save callback failed: {e}")
+            self.jobs.task_done()
+
+    def stats(self):
+        with self.lock:
+            return {"saved": self.saved, "failed": self.failed, "rejected": self.rejected,
+                    "pending": self.pending()}
+
+    def close(self, wait=True):
+        # Finishes queued saves when wait is True
+        if wait:
+            self.jobs.join()
+        for _ in self.workers:
+            self.jobs.put(None)
+        for t in self.workers:
+            t.join(timeout=5.0 if wait else 0.1)
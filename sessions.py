@@ -0,0 +1,168 @@
+import itertools
+import threading
+import time
+
+from inference import GRAPH_BYTES, tracker_graphs
+
+# Painter settings for sessions admitted beyond the full-quality limit: the
+# picture and UI stay at camera resolution, but the hand model sees a small
+# input on every third frame (sooner when the picture moves)
+DEGRADED_OPTIONS = {
+    "inference_width": 320,
+    "inference_interval": 3,
+    "motion_threshold": 6.0,
+}
+
+def painter_memory(painter):
+    # Approximate bytes held by one painter's per-session buffers, including
+    # its hand tracking graph, by far the largest of them
+    total = GRAPH_BYTES * tracker_graphs(painter.hands)
+    for buf in (painter.canvas, painter.ink_mask, painter.frame_buffer):
+        if buf is not None:
+            total += buf.nbytes
+    total += sum(buf.nbytes for buf in painter.preprocessor.buffers.values())
+    total += painter.history.stats()["bytes"]
+    total += sum(len(s.points) * s.points.itemsize for s in painter.stroke_log.strokes)
+    return total
+
+class Session:
+    # One connected peer. lock is held while a frame is being processed so the
+    # reaper never closes a painter that is in use.
+    def __init__(self, manager, sid, degraded):
+        self.manager = manager
+        self.id = sid
+        self.degraded = degraded
+        self.options = dict(DEGRADED_OPTIONS) if degraded else {}
+        self.painter = None
+        self.lock = threading.Lock()
+        self.created = time.time()
+        self.last_active = self.created
+        self.frames = 0
+        self.cpu_time = 0.0
+        self.frame_ms = 0.0
+        self.closed = False
+
+    def record(self, cpu_time, wall_time):
+        self.last_active = time.time()
+        self.frames += 1
+        self.cpu_time += cpu_time
+        # Smoothed wall time per frame
+        if self.frames == 1:
+            self.frame_ms = wall_time * 1000.0
+        else:
+            self.frame_ms += (wall_time * 1000.0 - self.frame_ms) * 0.1
+
+    def stats(self):
+        painter = self.painter
+        now = time.time()
+        return {
+            "id": self.id,
+            "degraded": self.degraded,
+            "frames": self.frames,
+            "cpu_s": round(self.cpu_time, 2),
+            "cpu_pct": round(100.0 * self.cpu_time / max(now - self.created, 1e-6), 1),
+            "frame_ms": round(self.frame_ms, 1),
+            "quality_tier": painter.quality.tier if painter is not None and painter.quality is not None else 0,
+            "memory_mb": round(painter_memory(painter) / 1e6, 1) if painter is not None else 0.0,
+            "idle_s": round(now - self.last_active, 1),
+        }
+
+    def release(self, background=False):
+        # Drops the painter (canvas, history, hand-tracking session). With
+        # background, it is closed on its own thread: pending saves still
+        # finish, but the caller does not wait for them.
+        painter, self.painter = self.painter, None
+        if painter is None:
+            return
+        if background:
+            threading.Thread(target=painter.close, name=f"session-{self.id}-release", daemon=True).start()
+        else:
+            painter.close()
+
+    def close(self):
+        self.manager.close(self)
+
+class SessionManager:
+    # Admission control for the web app. The first full_sessions peers get
+    # the normal painter, the rest up to max_sessions run degraded, and peers
+    # beyond that are turned away until a slot frees up. Sessions that send no
+    # frames for idle_timeout seconds are closed and their painters released.
+    def __init__(self, max_sessions=8, full_sessions=4, idle_timeout=300.0, reap_interval=10.0):
+        self.max_sessions = max_sessions
+        self.full_sessions = min(full_sessions, max_sessions)
+        self.idle_timeout = idle_timeout
+        self.reap_interval = reap_interval
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.ids = itertools.count(1)
+        self.rejected = 0
+        self.reclaimed = 0
+        self.last_reap = time.time()
+
+    def admit(self):
+        # Returns a new Session, or None when the server is full
+        self.reap()
+        with self.lock:
+            active = len(self.sessions)
+            if active >= self.max_sessions:
+                self.rejected += 1
+                return None
+            full = sum(1 for s in self.sessions.values() if not s.degraded)
+            session = Session(self, next(self.ids), degraded=full >= self.full_sessions)
+            self.sessions[session.id] = session
+        mode = "degraded" if session.degraded else "full"
+        print(f"[FunDraw_ChemLab] Session {session.id} admitted ({mode}, {active + 1}/{self.max_sessions})")
+        return session
+
+    def close(self, session):
+        with self.lock:
+            if session.closed:
+                return
+            session.closed = True
+            self.sessions.pop(session.id, None)
+        with session.lock:
+            session.release()
+
+    def reap(self, now=None):
+        # Closes idle sessions; cheap to call on every frame
+        now = time.time() if now is None else now
+        if now - self.last_reap < self.reap_interval:
+            return 0
+        self.last_reap = now
+        with self.lock:
+            idle = [s for s in self.sessions.values() if now - s.last_active > self.idle_timeout]
+        count = 0
+        for session in idle:
+            # Skip sessions that woke up and are processing a frame right now
+            if not session.lock.acquire(blocking=False):
+                continue
+            try:
+                with self.lock:
+                    if session.closed or now - session.last_active <= self.idle_timeout:
+                        continue
+                    session.closed = True
+                    self.sessions.pop(session.id, None)
+                # Reaping runs on another peer's frame thread, which must not
+                # wait for this session's saves to drain
+                session.release(background=True)
+                count += 1
+            finally:
+                session.lock.release()
+        if count:
+            self.reclaimed += count
+            print(f"[FunDraw_ChemLab] Reclaimed {count} idle session(s)")
+        return count
+
+    def stats(self):
+        with self.lock:
+            sessions = list(self.sessions.values())
+        per_session = [s.stats() for s in sessions]
+        return {
+            "sessions": len(sessions),
+            "max_sessions": self.max_sessions,
+            "degraded": sum(1 for s in sessions if s.degraded),
+            "rejected": self.rejected,
+            "reclaimed": self.reclaimed,
+            "memory_mb": round(sum(s["memory_mb"] for s in per_session), 1),
+            "per_session": per_session,
+        }